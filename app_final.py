@@ -1,26 +1,539 @@
 # app.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 import altair as alt
 import os
+import csv
+from bisect import bisect_left
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pyarrow import csv as pacsv
 import plotly.express as px
 import plotly.graph_objects as go
 
 st.set_page_config(page_title="Lung Transplant Data Visualization", page_icon="🫁", layout="wide")
 
-@st.cache_data
+# Use relative path to look in the same folder as app.py
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Columns the app reads from each table and the compact type each is stored in
+# once loaded (None = keep as read). Narrow ints/floats halve the bytes the
+# groupby and sum kernels stream through. Rates stay float64: they are shown and
+# exported as stored, and float32 would print 0.2 as 0.20000000298023224.
+# Unlisted tables are read whole.
+TABLE_COLUMNS = {
+    'viz_map_data': {
+        'Year': 'int16', 'Month': 'int8', 'YearMonthNum': 'int32',
+        'OPO': None, 'OPO_Zip': None, 'OPO_Lat': 'float32', 'OPO_Lon': 'float32',
+        'Center': None, 'Center_Zip': None, 'Center_Lat': 'float32', 'Center_Lon': 'float32',
+        'Count': 'int32', 'DCU_Rate': None, 'DCU_num': None, 'DCU_den': 'int32',
+    },
+    'viz_map_tiles': {
+        'OPO': None, 'Center': None, 'YearMonthNum': 'int32',
+        'OPO_Lat': 'float32', 'OPO_Lon': 'float32', 'Center_Lat': 'float32', 'Center_Lon': 'float32',
+        'OPO_Zip': None, 'Center_Zip': None, 'Count': 'int32', 'DCU_num': None, 'DCU_den': 'int32',
+    },
+    'viz_donor_utilization': {
+        'Year': 'int16', 'Month': 'int8', 'DON_OPO': None, 'CAS_Period': None, 'DCD': None,
+        'Total_Donors': 'int32', 'Used_Donors': 'int32', 'Utilization_Rate': None, 'DCU_Rate': None,
+    },
+    'viz_util_cube': {
+        'DON_OPO': None, 'CAS_Period': None, 'DCD': None, 'Used_Donors': 'int32', 'Total_Donors': 'int32',
+    },
+    'viz_lundon_summary': {'DON_OPO': None, 'Mean_LUNDON': None},
+    'viz_opo_locations': {'OPO': None, 'OPO_Lat': 'float32', 'OPO_Lon': 'float32', 'Transplants': 'int32'},
+}
+
+def read_csv_table(path, columns):
+    # pyarrow's multithreaded reader, parsing only the listed columns that exist in
+    # this file (older outputs lack some), straight into Arrow-backed pandas columns
+    convert_options = None
+    if columns:
+        with open(path, newline='') as f:
+            header = next(csv.reader(f))
+        convert_options = pacsv.ConvertOptions(include_columns=[c for c in columns if c in header])
+    table = pacsv.read_csv(path, convert_options=convert_options)
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def downcast(df, columns):
+    # Cast to the storage types above after loading, so CSV and Parquet inputs end
+    # up identical (Used_Donors is written as 2.0 etc., so it can't be parsed as int)
+    return df.astype({c: f"{t}[pyarrow]" for c, t in columns.items() if t and c in df.columns})
+
+def read_parquet_table(path, columns):
+    # Column-pruned read: only the listed columns present in this file (checked
+    # against the footer schema, older outputs lack some) are decoded
+    if columns:
+        present = pq.read_schema(path).names
+        columns = [c for c in columns if c in present]
+    return pd.read_parquet(path, engine="pyarrow", columns=columns, dtype_backend="pyarrow")
+
+def read_table(name):
+    # Prefer the Parquet output of precompute.py (typed, columnar), fall back to CSV
+    parquet_path = os.path.join(SCRIPT_DIR, f"{name}.parquet")
+    if os.path.exists(parquet_path):
+        return read_parquet_table(parquet_path, TABLE_COLUMNS.get(name))
+    return read_csv_table(os.path.join(SCRIPT_DIR, f"{name}.csv"), TABLE_COLUMNS.get(name))
+
+def as_category(df, columns):
+    # Integer-coded name keys: groupby/isin work on small ints instead of hashing strings
+    return df.astype({c: 'category' for c in columns if c in df.columns})
+
+# Name keys that are cast to categorical when a table is loaded
+CATEGORY_COLUMNS = {
+    'viz_map_data': ['OPO', 'Center'],
+    'viz_map_tiles': ['OPO', 'Center'],
+    'viz_survival_curves': ['Group'],
+    'viz_opo_locations': ['OPO'],
+    'viz_donor_utilization': ['DON_OPO', 'CAS_Period'],
+    'viz_util_cube': ['DON_OPO', 'CAS_Period'],
+}
+
+@st.cache_resource(show_spinner=False)
+def load_table(name):
+    # One cache entry per file. The frames are read-only globals, so cache_resource
+    # hands back the same object on every rerun instead of hashing/copying it.
+    df = downcast(read_table(name), TABLE_COLUMNS.get(name, {}))
+    return as_category(df, CATEGORY_COLUMNS.get(name, []))
+
+def isin_codes(col, values):
+    # Membership on a categorical column via its integer codes: the handful of
+    # values is looked up once in the categories, then one int compare per row
+    codes = col.cat.categories.get_indexer(list(values))
+    return np.isin(col.cat.codes.to_numpy(), codes[codes >= 0])
+
+@st.cache_resource(show_spinner=False)
+def load_stats_by_opo():
+    # P-values indexed by OPO for direct lookups in the survival tab
+    return load_table('viz_survival_stats').set_index('OPO', drop=False)
+
 def load_data():
-    # Use relative path to look in the same folder as app.py
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+    # Map rows are used by every tab (OPO locations), so they load up front
+    try:
+        return load_table('viz_map_data')
+    except FileNotFoundError:
+        return pd.DataFrame()
+
+def load_survival_data():
+    # Only called from the Survival tab: the curves aren't read until it is opened
     try:
-        map_df = pd.read_csv(os.path.join(script_dir, 'viz_map_data.csv'))
-        surv_df = pd.read_csv(os.path.join(script_dir, 'viz_survival_curves.csv'))
-        stats_df = pd.read_csv(os.path.join(script_dir, 'viz_survival_stats.csv'))
-        return map_df, surv_df, stats_df
+        surv_df = load_table('viz_survival_curves')
+        stats_df = load_table('viz_survival_stats')
+        return surv_df, stats_df, load_stats_by_opo()
     except FileNotFoundError:
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
 
-map_data, survival_data, survival_stats = load_data()
+map_data = load_data()
+
+@st.cache_resource(show_spinner=False)
+def load_opo_locations():
+    # One row per OPO: location and all-time transplants, for the survival and
+    # utilization selection maps. Written by precompute.py; derived if missing.
+    try:
+        return load_table('viz_opo_locations')
+    except FileNotFoundError:
+        map_df = load_table('viz_map_data')
+        # Coordinates are fixed per OPO, so take them from the first row instead
+        # of a groupby-first; only the transplant count needs a reduction
+        coords = map_df.drop_duplicates('OPO').set_index('OPO')[['OPO_Lat', 'OPO_Lon']]
+        totals = map_df.groupby('OPO', observed=True)['Count'].sum().rename('Transplants')
+        return coords.join(totals).sort_index().reset_index()
+
+# US state outlines for the map background. Served locally from ./static when the
+# file is present (server.enableStaticServing in .streamlit/config.toml) so the
+# browser doesn't refetch it from the CDN; otherwise fall back to the CDN. The
+# slimmer copy precompute.py writes next to the download is preferred.
+US_STATES_TOPOJSON = next(
+    (f'app/static/{name}' for name in ('states-quantized.json', 'states-10m.json')
+     if os.path.exists(os.path.join(SCRIPT_DIR, 'static', name))),
+    'https://cdn.jsdelivr.net/npm/us-atlas@3/states-10m.json'
+)
+
+# Per-OPO monthly rollup written to ./static by precompute.py. When present the
+# map's OPO layer loads it by URL and sums the slider range in the browser.
+OPO_BY_YM_URL = (
+    'app/static/viz_opo_by_ym.json'
+    if os.path.exists(os.path.join(SCRIPT_DIR, 'static', 'viz_opo_by_ym.json'))
+    else None
+)
+
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+TILE_KEYS = ['OPO', 'Center', 'YearMonthNum']
+# Fixed per OPO/Center pair: carried through with 'first' rather than hashed as keys
+TILE_ATTRS = ['OPO_Lat', 'OPO_Lon', 'Center_Lat', 'Center_Lon', 'OPO_Zip', 'Center_Zip']
+
+def build_map_tiles(map_df):
+    # One tile per OPO x Center x month. DCU is carried as numerator/denominator so
+    # any date range sums back to a transplant-weighted rate.
+    if 'Month' not in map_df.columns:
+        # Fallback for old data without Month
+        map_df = map_df.assign(Month=1)
+    if 'YearMonthNum' not in map_df.columns:
+        # Widen first: Year/Month are read as int16/int8
+        map_df = map_df.assign(YearMonthNum=map_df['Year'].astype('int32') * 100 + map_df['Month'].astype('int32'))
+    if 'DCU_num' not in map_df.columns:
+        # Older outputs only have the per-group rate, shared by every transplant in the group
+        map_df = map_df.assign(DCU_num=map_df['DCU_Rate'] * map_df['Count'], DCU_den=map_df['Count'])
+    return map_df.groupby(TILE_KEYS, sort=False, observed=True).agg(
+        **{c: (c, 'first') for c in TILE_ATTRS},
+        Count=('Count', 'sum'),
+        DCU_num=('DCU_num', 'sum'),
+        DCU_den=('DCU_den', 'sum')
+    ).reset_index()
+
+@st.cache_resource(show_spinner=False)
+def prep_map_data():
+    # The monthly tiles, the sorted slider options and their labels only depend
+    # on the data, so build them once instead of on every slider move
+    try:
+        tiles = load_table('viz_map_tiles')
+    except FileNotFoundError:
+        tiles = build_map_tiles(load_table('viz_map_data'))
+    # Keep tiles ordered by month so a date range is a contiguous slice (see run_viz_tab)
+    if not tiles['YearMonthNum'].is_monotonic_increasing:
+        tiles = tiles.sort_values('YearMonthNum', kind='stable', ignore_index=True)
+    all_ym_nums = tuple(int(ym) for ym in tiles['YearMonthNum'].unique())
+    ym_labels = {ym: f"{MONTH_NAMES[ym % 100 - 1]} {ym // 100}" for ym in all_ym_nums}
+    return tiles, all_ym_nums, ym_labels
+
+MAP_CELL_COLS = ['OPO', 'Center', 'OPO_Lat', 'OPO_Lon', 'Center_Lat', 'Center_Lon', 'OPO_Zip', 'Center_Zip']
+MAP_MEASURES = ['Count', 'DCU_num', 'DCU_den']
+
+@st.cache_resource(show_spinner=False)
+def prep_map_sat():
+    # Summed-area table over months: one row per OPO x Center cell, one column per
+    # slider month, holding running totals. Any slider range is then
+    # cum[:, hi] - cum[:, lo - 1] instead of a groupby over the tiles.
+    tiles, all_ym_nums, _ = prep_map_data()
+    cell_idx = tiles.groupby(['OPO', 'Center'], sort=False, observed=True).ngroup().to_numpy()
+    cells = tiles.drop_duplicates(['OPO', 'Center'])[MAP_CELL_COLS].reset_index(drop=True)
+    month_idx = np.searchsorted(all_ym_nums, tiles['YearMonthNum'].to_numpy())
+    sat = {}
+    for measure in MAP_MEASURES:
+        values = tiles[measure].to_numpy()
+        grid = np.zeros((len(cells), len(all_ym_nums)), dtype=values.dtype)
+        np.add.at(grid, (cell_idx, month_idx), values)
+        sat[measure] = np.cumsum(grid, axis=1)
+    return cells, sat
+
+@st.cache_resource(show_spinner=False)
+def prep_map_opo_sat():
+    # The same running totals rolled up to one row per OPO, so the OPO layer's
+    # range totals are also a difference rather than a second groupby
+    cells, sat = prep_map_sat()
+    opo_idx = cells.groupby('OPO', sort=False, observed=True).ngroup().to_numpy()
+    opos = cells.drop_duplicates('OPO')[['OPO', 'OPO_Lat', 'OPO_Lon']].reset_index(drop=True)
+    opo_sat = {}
+    for measure, cum in sat.items():
+        opo_cum = np.zeros((len(opos), cum.shape[1]), dtype=cum.dtype)
+        np.add.at(opo_cum, opo_idx, cum)
+        opo_sat[measure] = opo_cum
+    return opos, opo_sat
+
+def range_totals(rows, sat, lo_i, hi_i):
+    # Rows with any transplants between months lo_i..hi_i, with their range totals
+    totals = {
+        m: sat[m][:, hi_i] - sat[m][:, lo_i - 1] if lo_i > 0 else sat[m][:, hi_i]
+        for m in MAP_MEASURES
+    }
+    in_range = totals['Count'] > 0
+    agg = rows[in_range].assign(
+        Transplants=totals['Count'][in_range],
+        DCU_num=totals['DCU_num'][in_range],
+        DCU_den=totals['DCU_den'][in_range]
+    ).reset_index(drop=True)
+    agg['DCU_Rate'] = agg['DCU_num'] / agg['DCU_den']
+    return agg
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def map_range_aggs(start_ym_num, end_ym_num):
+    # Per-connection and per-OPO totals for one slider range. Dragging
+    # back to a range seen before is a cache hit instead of another reduction.
+    _, all_ym_nums, _ = prep_map_data()
+    # Slider options are sorted, so binary search instead of a tuple.index scan
+    lo_i = bisect_left(all_ym_nums, start_ym_num)
+    hi_i = bisect_left(all_ym_nums, end_ym_num)
+    conn_agg = range_totals(*prep_map_sat(), lo_i, hi_i)
+    opo_agg = range_totals(*prep_map_opo_sat(), lo_i, hi_i)
+    return conn_agg, opo_agg
+
+@st.cache_resource(show_spinner=False)
+def map_full_range_aggs():
+    # The full range is the slider's default, i.e. what every session opens on, so
+    # keep it pinned here rather than subject to map_range_aggs' LRU eviction
+    _, all_ym_nums, _ = prep_map_data()
+    return map_range_aggs(all_ym_nums[0], all_ym_nums[-1])
+
+CAS_PERIODS = ["Pre-CAS", "Post-CAS"]
+
+@st.cache_resource(show_spinner=False)
+def load_util_rows():
+    # Monthly utilization rows indexed by CAS period (ordered Pre -> Post, so the
+    # index is sorted and still chronological). A CAS filter is then an index
+    # slice instead of a copy plus a boolean mask.
+    util_df = load_table("viz_donor_utilization")
+    util_df = util_df.astype({"CAS_Period": pd.CategoricalDtype(CAS_PERIODS, ordered=True)})
+    return util_df.set_index("CAS_Period").sort_index(kind="stable")
+
+UTIL_TABLE_COLUMNS = [
+    "Year",
+    "Month",
+    "DON_OPO",
+    "CAS_Period",
+    "DCD",
+    "Total_Donors",
+    "Used_Donors",
+    "Utilization_Rate",
+    "DCU_Rate",
+]
+UTIL_TABLE_LABELS = ["DCD(1) vs DBD(0)" if c == "DCD" else c for c in UTIL_TABLE_COLUMNS]
+# Same columns minus CAS_Period, which is the index of load_util_rows()
+UTIL_TABLE_ROW_COLUMNS = [c for c in UTIL_TABLE_COLUMNS if c != "CAS_Period"]
+UTIL_TABLE_PAGE_ROWS = 500
+UTIL_TABLE_STATIC_ROWS = 100
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def util_table(opos, cas_filter):
+    # Rows behind the utilization tab's data table for one (sorted OPO tuple, CAS
+    # period) pair. Reruns that don't change either reuse the built table.
+    if cas_filter == "All":
+        # File order: within a month the two CAS periods stay interleaved, as
+        # they were before the rows were indexed by period
+        df = load_table("viz_donor_utilization")[UTIL_TABLE_COLUMNS]
+    else:
+        # Project to the displayed columns first, so the slice and the flattening
+        # only move those
+        df = load_util_rows()[UTIL_TABLE_ROW_COLUMNS].loc[cas_filter:cas_filter].reset_index()
+    if opos:
+        # Filter on the DON_OPO codes, so only kept rows are copied
+        df = df[isin_codes(df["DON_OPO"], opos)]
+    table_df = df[UTIL_TABLE_COLUMNS]
+    # Fresh frame from the column selection, so relabel in place instead of rename()
+    table_df.columns = UTIL_TABLE_LABELS
+    # Converted to Arrow once per key; st.dataframe sends an Arrow table as is.
+    # The categorical DON_OPO / CAS_Period become dictionary-encoded columns.
+    return pa.Table.from_pandas(table_df, preserve_index=False)
+
+UTIL_CUBE_KEYS = ["DON_OPO", "CAS_Period", "DCD"]
+
+@st.cache_resource(show_spinner=False)
+def load_util_cube():
+    # Donor sums per OPO x CAS period x donor type (DCD). Every utilization number in
+    # the tab is a slice of this small table rather than a groupby over monthly rows.
+    try:
+        cube = load_table("viz_util_cube")
+    except FileNotFoundError:
+        cube = load_table("viz_donor_utilization").groupby(UTIL_CUBE_KEYS, sort=False, observed=True)[
+            ["Used_Donors", "Total_Donors"]
+        ].sum().reset_index()
+    return cube.set_index(UTIL_CUBE_KEYS).sort_index()
+
+@st.cache_resource(show_spinner=False)
+def util_opo_map_base():
+    # OPO locations joined with overall utilization for the utilization map's
+    # coloring/size. Neither depends on a filter, so this is built once.
+    opo_locations = load_opo_locations().set_index("OPO").rename(columns={"Transplants": "Total_Transplants"})
+    overall_util = (
+        load_table("viz_donor_utilization").groupby("DON_OPO", sort=False, observed=True)
+        .agg(
+            Overall_Utilization=("Utilization_Rate", "mean"),
+            Overall_DCU=("DCU_Rate", "mean"),
+            Overall_Donors=("Total_Donors", "sum")
+        )
+    )
+    # Both are keyed by OPO code: join on the index, flatten once for the map
+    return opo_locations.join(overall_util).rename_axis("DON_OPO").reset_index()
+
+UTIL_CAS_FILTERS = ["All"] + CAS_PERIODS
+
+@st.cache_resource(show_spinner=False)
+def util_totals():
+    # Donor sums per OPO and per OPO x DCD for every CAS filter value, built once.
+    # A filter change in the tab is then a dict lookup instead of cube groupbys.
+    cube = load_util_cube()
+    totals = {}
+    for cas_filter in UTIL_CAS_FILTERS:
+        part = cube if cas_filter == "All" else cube.xs(cas_filter, level="CAS_Period")
+        by_opo_dcd = part.groupby(level=["DON_OPO", "DCD"], observed=True)[["Used_Donors", "Total_Donors"]].sum()
+        by_opo = by_opo_dcd.groupby(level="DON_OPO", observed=True).sum()
+        totals[cas_filter] = (by_opo, by_opo_dcd)
+    return totals
+
+@st.cache_resource(show_spinner=False)
+def national_rates():
+    # National utilization, overall and per DCD status, for every CAS filter value.
+    # Built once next to util_totals; the metrics and bar figures look them up.
+    rates = {}
+    for cas_filter, (by_opo, by_opo_dcd) in util_totals().items():
+        # National Utilization = Total Used / Total Donors (not mean of rates)
+        national_util = by_opo["Used_Donors"].sum() / by_opo["Total_Donors"].sum() if by_opo["Total_Donors"].sum() > 0 else 0
+
+        # DCD/DBD national utilization from one grouped sum (index: DCD 0/1)
+        dcd_totals = by_opo_dcd.groupby(level="DCD", sort=False).sum()
+        dcd_totals = dcd_totals[dcd_totals["Total_Donors"] > 0]
+        rates[cas_filter] = (national_util, dcd_totals["Used_Donors"] / dcd_totals["Total_Donors"])
+    return rates
+
+@st.cache_resource(show_spinner=False, scope="session")
+def base_geo_fig(lons, lats, texts, hovertemplate, marker, height):
+    # OPO point map with the fixed geo layout. Positions, sizes and layout only
+    # change with the data, so the figure is built once per session and the
+    # tabs patch the selection-dependent styling/customdata in place.
+    fig = go.Figure(go.Scattergeo(
+        lon=lons,
+        lat=lats,
+        text=texts,
+        hovertemplate=hovertemplate,
+        mode='markers',
+        marker=marker
+    ))
+    fig.update_geos(
+        scope='usa',
+        showland=True,
+        landcolor='lightgray',
+        showlakes=True,
+        lakecolor='white',
+        showcoastlines=True,
+        coastlinecolor='white'
+    )
+    fig.update_layout(
+        height=height,
+        margin=dict(l=0, r=0, t=0, b=0),
+        geo=dict(bgcolor='rgba(0,0,0,0)'),
+        dragmode=False  # Disable drag/pan
+    )
+    return fig
+
+# State outlines under the connections map. Nothing in it depends on the data or
+# the selection, so every render shares this one layer dict.
+MAP_BACKGROUND_LAYER = {
+    'data': {'url': US_STATES_TOPOJSON, 'format': {'type': 'topojson', 'feature': 'states'}},
+    'mark': {'type': 'geoshape', 'fill': 'lightgray', 'stroke': 'white'},
+    'projection': {'type': 'albersUsa'},
+}
+
+def viz_map_spec(selection_name, start_ym_num, end_ym_num):
+    # Connections map as a plain Vega-Lite dict. Going through alt.Chart re-ran
+    # Altair's schema validation and to_dict() on every slider move; this is the
+    # same spec written out, with the layer data supplied as named datasets.
+    store = f"data('{selection_name}_store')"
+    # Show a layer's rows only when an OPO is clicked, and only for that OPO
+    # (the selection starts out holding the '__NONE__' placeholder)
+    selected_filter = (
+        f"length({store}) > 0 && {store}[0].values[0] != '__NONE__' && datum.OPO == {store}[0].values[0]"
+    )
+
+    if OPO_BY_YM_URL:
+        # The browser caches the static rollup; a slider move only changes the two
+        # bounds in the filter below instead of re-sending the aggregated rows
+        opo_data = {'url': OPO_BY_YM_URL}
+        opo_transform = [
+            {'filter': f"datum.YearMonthNum >= {start_ym_num} && datum.YearMonthNum <= {end_ym_num}"},
+            {
+                'aggregate': [
+                    {'op': 'sum', 'field': 'Count', 'as': 'Transplants'},
+                    {'op': 'sum', 'field': 'DCU_num', 'as': 'DCU_num'},
+                    {'op': 'sum', 'field': 'DCU_den', 'as': 'DCU_den'},
+                ],
+                'groupby': ['OPO', 'OPO_Lat', 'OPO_Lon'],
+            },
+            {'calculate': 'datum.DCU_num / datum.DCU_den', 'as': 'DCU_Rate'},
+        ]
+    else:
+        opo_data = {'name': 'opo'}
+        opo_transform = []
+
+    opo_points = {
+        'name': 'opo_points',
+        'data': opo_data,
+        'transform': opo_transform,
+        'mark': {'type': 'circle', 'stroke': 'white', 'strokeWidth': 1.5},
+        'encoding': {
+            'longitude': {'field': 'OPO_Lon', 'type': 'quantitative'},
+            'latitude': {'field': 'OPO_Lat', 'type': 'quantitative'},
+            'size': {
+                'field': 'Transplants',
+                'type': 'quantitative',
+                'scale': {'type': 'linear', 'domain': [0, 1000], 'range': [100, 2000]},
+                'legend': None,
+            },
+            'color': {
+                'field': 'DCU_Rate',
+                'type': 'quantitative',
+                'scale': {'domain': [0, 0.5, 1], 'range': ['#2166ac', '#9970ab', '#b2182b']},
+                'legend': {
+                    'title': 'DCU-era donor', 'format': '.0%', 'orient': 'right',
+                    'direction': 'vertical', 'offset': 10, 'legendY': 200,
+                },
+            },
+            'opacity': {
+                'condition': {
+                    'test': f"length({store}) == 0 || {store}[0].values[0] == '__NONE__' || datum.OPO == {store}[0].values[0]",
+                    'value': 0.75,  # Semi-transparent when visible
+                },
+                'value': 0,
+            },
+            'tooltip': [
+                {'field': 'OPO', 'type': 'nominal', 'title': 'OPO'},
+                {'field': 'Transplants', 'type': 'quantitative', 'title': 'Total Transplants'},
+                {'field': 'DCU_Rate', 'type': 'quantitative', 'title': 'DCU-era donor', 'format': '.2%'},
+            ],
+        },
+    }
+
+    lines = {
+        'data': {'name': 'conn'},
+        'transform': [{'filter': selected_filter}],
+        'mark': {'type': 'rule', 'color': 'orange', 'strokeWidth': 2, 'opacity': 0.6},
+        'encoding': {
+            'longitude': {'field': 'OPO_Lon', 'type': 'quantitative'},
+            'latitude': {'field': 'OPO_Lat', 'type': 'quantitative'},
+            'longitude2': {'field': 'Center_Lon'},
+            'latitude2': {'field': 'Center_Lat'},
+            'detail': {'field': 'OPO', 'type': 'nominal'},
+        },
+    }
+
+    center_points = {
+        'data': {'name': 'conn'},
+        'transform': [{'filter': selected_filter}],
+        'mark': {
+            'type': 'point', 'shape': 'triangle', 'filled': True, 'color': 'gold',
+            'strokeWidth': 1, 'stroke': 'darkorange',
+        },
+        'encoding': {
+            'longitude': {'field': 'Center_Lon', 'type': 'quantitative'},
+            'latitude': {'field': 'Center_Lat', 'type': 'quantitative'},
+            'size': {
+                'field': 'Transplants',
+                'type': 'quantitative',
+                'scale': {'type': 'pow', 'exponent': 0.8, 'domain': [0, 120], 'range': [10, 700]},
+                'legend': None,
+            },
+            'detail': {'field': 'OPO', 'type': 'nominal'},
+            'tooltip': [
+                {'field': 'Center', 'type': 'nominal', 'title': 'Transplant Center'},
+                {'field': 'Center_Zip', 'type': 'nominal', 'title': 'ZIP Code'},
+                {'field': 'Transplants', 'type': 'quantitative', 'title': 'Transplants from OPO'},
+                {'field': 'OPO', 'type': 'nominal', 'title': 'OPO'},
+            ],
+        },
+    }
+
+    return {
+        'width': 900,
+        'height': 500,
+        'params': [{
+            'name': selection_name,
+            'select': {'type': 'point', 'fields': ['OPO'], 'on': 'click', 'clear': 'dblclick'},
+            'value': [{'OPO': '__NONE__'}],  # Initial state: matches nothing real
+            'views': ['opo_points'],
+        }],
+        'layer': [MAP_BACKGROUND_LAYER, opo_points, lines, center_points],
+        'resolve': {'scale': {'size': 'independent'}},
+    }
 
 # --- TAB 1: Viz Map ---
 @st.fragment
@@ -30,32 +543,16 @@ def run_viz_tab():
         st.error("Map data not found. Run precompute.py first.")
         return
 
-    if 'Month' in map_data.columns:
-        map_data_local = map_data.copy()
-    else:
-        # Fallback for old data without Month
-        map_data_local = map_data.copy()
-        map_data_local['Month'] = 1
-    
-    map_data_local['YearMonthNum'] = map_data_local['Year'] * 100 + map_data_local['Month']
-    
-    all_ym_nums = sorted(map_data_local['YearMonthNum'].unique())
-    
-    month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    def ym_to_label(ym_num):
-        year = ym_num // 100
-        month = ym_num % 100
-        return f"{month_names[month-1]} {year}"
-    
-    min_ym = min(all_ym_nums)
-    max_ym = max(all_ym_nums)
+    map_tiles, all_ym_nums, ym_labels = prep_map_data()
+    min_ym = all_ym_nums[0]
+    max_ym = all_ym_nums[-1]
     
     cas_ym = 202303
     if min_ym <= cas_ym <= max_ym:
         # Calculate relative position for the marker
         total_range = len(all_ym_nums)
-        cas_index = all_ym_nums.index(cas_ym) if cas_ym in all_ym_nums else -1
-        if cas_index >= 0:
+        cas_index = bisect_left(all_ym_nums, cas_ym)
+        if all_ym_nums[cas_index] == cas_ym:
             position_pct = cas_index / (total_range - 1) * 100
             st.markdown(
                 f"""
@@ -73,7 +570,7 @@ def run_viz_tab():
         "Select Date Range",
         options=all_ym_nums,
         value=(min_ym, max_ym),
-        format_func=ym_to_label
+        format_func=ym_labels.get
     )
     start_ym_num, end_ym_num = selected_range
     
@@ -83,120 +580,22 @@ def run_viz_tab():
         st.session_state.map_reset_counter = 0
     map_version = st.session_state.map_reset_counter
     
-    filtered = map_data_local[(map_data_local['YearMonthNum'] >= start_ym_num) & (map_data_local['YearMonthNum'] <= end_ym_num)]
-    
-    conn_agg = filtered.groupby(['OPO', 'Center', 'OPO_Lat', 'OPO_Lon', 'Center_Lat', 'Center_Lon']).agg({
-        'Count': 'sum',
-        'DCU_Rate': 'mean',
-        'OPO_Zip': 'first',
-        'Center_Zip': 'first'
-    }).reset_index().rename(columns={'Count': 'Transplants'})
-
-    opo_agg = conn_agg.groupby('OPO').agg({
-        'Transplants': 'sum', 
-        'DCU_Rate': 'mean', 
-        'OPO_Lat': 'first', 
-        'OPO_Lon': 'first'
-    }).reset_index()
-    
-    center_agg = conn_agg.groupby(['OPO', 'Center']).agg({
-        'Transplants': 'sum',
-        'Center_Lat': 'first',
-        'Center_Lon': 'first',
-        'Center_Zip': 'first'
-    }).reset_index()
-    center_agg = center_agg.rename(columns={'Transplants': 'Center_Transplants'})
-
-    us_states = alt.topo_feature('https://cdn.jsdelivr.net/npm/us-atlas@3/states-10m.json', 'states')
-    background = alt.Chart(us_states).mark_geoshape(
-        fill='lightgray', 
-        stroke='white'
-    ).project('albersUsa').properties(
-        width=900,
-        height=500
-    )
-    
-    selection_name = f'SelectOPO_{map_version}'
-    store_name = f'{selection_name}_store'
-    select_opo = alt.selection_point(
-        fields=['OPO'], 
-        on='click', 
-        clear='dblclick',
-        name=selection_name,
-        value=[{'OPO': '__NONE__'}]  # Initial state: matches nothing real
-    )
-    
-    opo_points = alt.Chart(opo_agg).mark_circle(
-        strokeWidth=1.5,
-        stroke='white'
-    ).encode(
-        longitude='OPO_Lon:Q',
-        latitude='OPO_Lat:Q',
-        size=alt.Size('Transplants:Q', 
-                      scale=alt.Scale(type='linear', domain=[0, 1000], range=[100, 2000]),
-                      legend=None),
-        color=alt.Color('DCU_Rate:Q',
-                        scale=alt.Scale(domain=[0, 0.5, 1], range=['#2166ac', '#9970ab', '#b2182b']),
-                        legend=alt.Legend(title='DCU-era donor', format='.0%', orient='right', direction='vertical', offset=10, legendY=200)),
-        opacity=alt.condition(
-            f"length(data('{store_name}')) == 0 || data('{store_name}')[0].values[0] == '__NONE__' || datum.OPO == data('{store_name}')[0].values[0]",
-            alt.value(0.75),  # Semi-transparent when visible
-            alt.value(0)
-        ),
-        tooltip=[
-            alt.Tooltip('OPO:N', title='OPO'),
-            alt.Tooltip('Transplants:Q', title='Total Transplants'),
-            alt.Tooltip('DCU_Rate:Q', title='DCU-era donor', format='.2%')
-        ]
-    ).add_params(
-        select_opo
-    )
-    
-    lines = alt.Chart(conn_agg).mark_rule(
-        color='orange', 
-        strokeWidth=2,
-        opacity=0.6
-    ).encode(
-        longitude='OPO_Lon:Q',
-        latitude='OPO_Lat:Q',
-        longitude2='Center_Lon:Q',
-        latitude2='Center_Lat:Q',
-        detail='OPO:N'
-    ).transform_filter(
-        # Show only when: store is non-empty AND value is not __NONE__ AND matches this OPO
-        f"length(data('{store_name}')) > 0 && data('{store_name}')[0].values[0] != '__NONE__' && datum.OPO == data('{store_name}')[0].values[0]"
-    )
-    
-    center_points = alt.Chart(center_agg).mark_point(
-        shape='triangle',
-        filled=True,
-        color='gold',
-        strokeWidth=1,
-        stroke='darkorange'
-    ).encode(
-        longitude='Center_Lon:Q',
-        latitude='Center_Lat:Q',
-        size=alt.Size('Center_Transplants:Q', 
-                      scale=alt.Scale(
-                          type='pow',  # Power scale
-                          exponent=0.8,
-                          domain=[0, 120],
-                          range=[10, 700]
-                      ), 
-                      legend=None),
-        detail='OPO:N',
-        tooltip=[
-            alt.Tooltip('Center:N', title='Transplant Center'),
-            alt.Tooltip('Center_Zip:N', title='ZIP Code'),
-            alt.Tooltip('Center_Transplants:Q', title='Transplants from OPO'),
-            alt.Tooltip('OPO:N', title='OPO')
-        ]
-    ).transform_filter(
-        # Show only when: store is non-empty AND value is not __NONE__ AND matches this OPO
-        f"length(data('{store_name}')) > 0 && data('{store_name}')[0].values[0] != '__NONE__' && datum.OPO == data('{store_name}')[0].values[0]"
-    )
-    
-    map_chart = (background + opo_points + lines + center_points).resolve_scale(size='independent')
+    if (start_ym_num, end_ym_num) == (min_ym, max_ym):
+        conn_agg, opo_agg = map_full_range_aggs()
+    else:
+        conn_agg, opo_agg = map_range_aggs(start_ym_num, end_ym_num)
+
+    # Dataset names are fixed, so a slider move only swaps the data under an
+    # unchanged spec (the URL variant also changes the two filter bounds)
+    map_spec = viz_map_spec(f'SelectOPO_{map_version}', start_ym_num, end_ym_num)
+    # conn_agg has one row per OPO-center pair, so the lines and the center
+    # triangles draw from the same dataset instead of sending the pairs twice
+    map_spec['datasets'] = {
+        'conn': conn_agg[['OPO', 'Center', 'Center_Zip', 'OPO_Lat', 'OPO_Lon', 'Center_Lat', 'Center_Lon', 'Transplants']],
+    }
+    if not OPO_BY_YM_URL:
+        # Each layer's data is sent as its own dataset, so hand it only the columns it encodes
+        map_spec['datasets']['opo'] = opo_agg[['OPO', 'OPO_Lat', 'OPO_Lon', 'Transplants', 'DCU_Rate']]
     
     col_reset, col_spacer = st.columns([1, 5])
     with col_reset:
@@ -204,7 +603,7 @@ def run_viz_tab():
             st.session_state.map_reset_counter += 1
             st.rerun()
     
-    st.altair_chart(map_chart, use_container_width=True, key=f"opo_map_{map_version}")
+    st.vega_lite_chart(map_spec, width="stretch", key=f"opo_map_{map_version}")
     
     # Summary statistics
     col1, col2, col3 = st.columns(3)
@@ -221,11 +620,13 @@ def run_viz_tab():
 @st.fragment
 def run_survival_tab():
     st.header("Survival Analysis")
+    survival_data, survival_stats, survival_stats_by_opo = load_survival_data()
     if survival_data.empty:
         st.error("Survival data not found. Run precompute.py first.")
         return
 
-    all_opos = sorted(survival_data[survival_data['Group'] != 'Nationwide']['Group'].unique())
+    # Group is categorical: its categories are exactly the groups present in the curves
+    all_opos = sorted(g for g in survival_data['Group'].cat.categories if g != 'Nationwide')
     
     if 'selected_opos_survival' not in st.session_state:
         st.session_state.selected_opos_survival = []
@@ -234,60 +635,40 @@ def run_survival_tab():
     st.write("**Click on OPO dots on the map to select/deselect. Green = selected, Blue = unselected.**")
     
     if not map_data.empty:
-        opo_locations = map_data.groupby('OPO').agg({
-            'OPO_Lat': 'first',
-            'OPO_Lon': 'first',
-            'Count': 'sum'
-        }).reset_index().rename(columns={'Count': 'Transplants'})
-        
-        opo_locations = opo_locations[opo_locations['OPO'].isin(all_opos)]
+        opo_locations = load_opo_locations()
+        opo_locations = opo_locations[isin_codes(opo_locations['OPO'], all_opos)]
         
         if len(opo_locations) > 0:
             
             # Add selection status and colors
-            opo_locations['Selected'] = opo_locations['OPO'].isin(st.session_state.selected_opos_survival)
-            opo_locations['Color'] = opo_locations['Selected'].apply(lambda x: '#2ca02c' if x else '#1f77b4')
-            opo_locations['Status'] = opo_locations['Selected'].apply(lambda x: 'Selected' if x else 'Click to select')
+            selected_mask = isin_codes(opo_locations['OPO'], frozenset(st.session_state.selected_opos_survival))
+            status = np.where(selected_mask, 'Selected', 'Click to select')
             
-            # Create Plotly figure
-            fig = go.Figure()
+            # Plain numpy arrays for the trace: Plotly would convert Series anyway
+            opo_names = opo_locations['OPO'].to_numpy(dtype=object)
+            transplants = opo_locations['Transplants'].to_numpy()
             
-            # Add scatter geo points
-            fig.add_trace(go.Scattergeo(
-                lon=opo_locations['OPO_Lon'],
-                lat=opo_locations['OPO_Lat'],
-                text=opo_locations['OPO'],
-                customdata=opo_locations[['OPO', 'Transplants', 'Status']].values,
+            # Base figure is cached per session; only the selection styling is patched
+            fig = base_geo_fig(
+                lons=opo_locations['OPO_Lon'].to_numpy(),
+                lats=opo_locations['OPO_Lat'].to_numpy(),
+                texts=opo_names,
                 hovertemplate='<b>%{customdata[0]}</b><br>Transplants: %{customdata[1]}<br>%{customdata[2]}<extra></extra>',
-                mode='markers',
                 marker=dict(
-                    size=opo_locations['Transplants'] / opo_locations['Transplants'].max() * 30 + 8,
-                    color=opo_locations['Color'],
+                    size=transplants / transplants.max() * 30 + 8,
                     line=dict(width=1, color='white'),
                     opacity=0.8
-                )
-            ))
-            
-            # Configure the map
-            fig.update_geos(
-                scope='usa',
-                showland=True,
-                landcolor='lightgray',
-                showlakes=True,
-                lakecolor='white',
-                showcoastlines=True,
-                coastlinecolor='white'
+                ),
+                height=400
             )
-            
-            fig.update_layout(
-                height=400,
-                margin=dict(l=0, r=0, t=0, b=0),
-                geo=dict(bgcolor='rgba(0,0,0,0)'),
-                dragmode=False  # Disable drag/pan
+            fig.update_traces(
+                # All-object columns, so the OPO names don't coerce the counts to strings
+                customdata=np.column_stack([opo_names, transplants.astype(object), status.astype(object)]),
+                marker_color=np.where(selected_mask, '#2ca02c', '#1f77b4')
             )
             
             config = {'scrollZoom': False, 'displayModeBar': False}
-            event = st.plotly_chart(fig, use_container_width=True, on_select="rerun", key="survival_plotly_map", config=config)
+            event = st.plotly_chart(fig, width="stretch", on_select="rerun", key="survival_plotly_map", config=config)
             
             # Handle click events
             if event and 'selection' in event and 'points' in event['selection']:
@@ -296,7 +677,7 @@ def run_survival_tab():
                     # Get clicked OPO name from the first point
                     clicked_idx = points[0].get('point_index', None)
                     if clicked_idx is not None:
-                        clicked_opo = opo_locations.iloc[clicked_idx]['OPO']
+                        clicked_opo = opo_names[clicked_idx]
                         # Toggle selection
                         if clicked_opo in st.session_state.selected_opos_survival:
                             st.session_state.selected_opos_survival.remove(clicked_opo)
@@ -322,7 +703,7 @@ def run_survival_tab():
     # Show Nationwide checkbox
     show_nationwide = st.checkbox("Show Nationwide Reference", True)
     groups = selected + ["Nationwide"] if show_nationwide else selected
-    plot_df = survival_data[survival_data['Group'].isin(groups)].copy()
+    plot_df = survival_data[isin_codes(survival_data['Group'], groups)]
     
     if plot_df.empty:
         st.warning("No data to display. Please select at least one OPO or enable Nationwide reference.")
@@ -344,21 +725,16 @@ def run_survival_tab():
     color_scale = alt.Scale(domain=domain, range=color_range)
     group_color_map = dict(zip(domain, color_range))
     
-    # Build p-value text annotations
-    stats_annotation = []
-    y_pos = 0.05
-    for opo in selected:
-        opo_stats = survival_stats[survival_stats['OPO'] == opo]
-        if not opo_stats.empty:
-            p_value = opo_stats['P_Value'].values[0]
-            color = group_color_map.get(opo, 'black')
-            stats_annotation.append({
-                'x': 50,
-                'y': y_pos,
-                'text': f"{opo}: p={p_value:.4f}",
-                'color': color
-            })
-            y_pos += 0.05
+    # Build p-value text annotations, stacked upward from y=0.05
+    # One index lookup for all selected OPOs (kept in selection order)
+    selected_with_stats = pd.Index(selected).intersection(survival_stats_by_opo.index, sort=False)
+    selected_stats = survival_stats_by_opo.loc[selected_with_stats]
+    stats_df = pd.DataFrame({
+        'x': 50,
+        'y': np.arange(1, len(selected_stats) + 1) * 0.05,
+        'text': selected_with_stats.astype(str) + ': p=' + np.char.mod('%.4f', selected_stats['P_Value'].to_numpy(dtype=float)),
+        'color': [group_color_map.get(opo, 'black') for opo in selected_with_stats]
+    })
     
     # Base chart
     base = alt.Chart(plot_df).encode(
@@ -390,8 +766,7 @@ def run_survival_tab():
     )
     
     # Text layer for p-value annotations
-    if stats_annotation:
-        stats_df = pd.DataFrame(stats_annotation)
+    if not stats_df.empty:
         text_layer = alt.Chart(stats_df).mark_text(
             align='left', 
             baseline='bottom', 
@@ -407,88 +782,180 @@ def run_survival_tab():
     else:
         chart = ci + lines
     
-    st.altair_chart(chart, use_container_width=True)
+    st.altair_chart(chart, width="stretch")
     
     # Summary statistics table
     if selected:
         st.subheader("Log-Rank Test Results")
         st.caption("P-values for each OPO compared against the rest of the nation (p < 0.05 highlighted in red)")
-        stats = survival_stats[survival_stats['OPO'].isin(selected)].copy()
-        stats['Significant'] = stats['P_Value'].apply(lambda x: '✓' if x < 0.05 else '')
+        # assign() returns a new frame, so the filtered slice is never written to
+        stats = survival_stats[survival_stats['OPO'].isin(selected)]
+        stats = stats.assign(Significant=np.where(stats['P_Value'].to_numpy() < 0.05, '✓', ''))
         st.dataframe(
             stats.style.map(lambda x: 'color: red; font-weight: bold' if isinstance(x, float) and x < 0.05 else '', subset=['P_Value']),
-            use_container_width=True
+            width="stretch"
         )
 
 
 # --- TAB 3: Utilization ---
-@st.fragment
-def run_utilization_tab():
-    st.header("Donor Transplant Utilization")
+@st.cache_resource(show_spinner=False, max_entries=64)
+def util_bar_figs(opos_for_chart, cas_filter, donor_type_filter):
+    # Utilization and LUNDON bar figures for one (sorted OPO tuple, CAS period,
+    # donor type) combination. The figures are only read afterwards, so reruns
+    # with unchanged filters reuse them instead of regrouping and rebuilding.
+    by_opo, by_opo_dcd = util_totals()[cas_filter]
+    national_util, dcd_rates = national_rates()[cas_filter]
+    # ---- Load LUNDON summary (DBD only) ----
+    try:
+        lundon_df = load_table("viz_lundon_summary")
+    except FileNotFoundError:
+        lundon_df = None
+    # Expect columns: ['DON_OPO', 'Mean_LUNDON']
 
-    # ---- Load donor utilization dataset ----
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    util_file = os.path.join(script_dir, "viz_donor_utilization.csv")
+    # --- Simple mode: All / DBD / DCD ---
+    if donor_type_filter != "Compare DCD vs DBD":
+        # Calculate utilization as sum(Used) / sum(Total) per OPO (Series indexed by OPO)
+        opo_totals = by_opo[by_opo.index.isin(opos_for_chart)]
+        opo_util = opo_totals["Used_Donors"] / opo_totals["Total_Donors"]
 
-    if not os.path.exists(util_file):
-        st.error("Utilization data not found. Run precompute.py first.")
-        return
+    # ---- Base chart dataframe (Utilization) ----
+        chart_df = pd.DataFrame(
+            {
+                "OPO": np.concatenate([["National"], opo_util.index.to_numpy()]),
+                "Utilization": np.concatenate([[national_util], opo_util.to_numpy()]),
+            }
+        )
 
-    util_df = pd.read_csv(util_file)
-    # ---- Load LUNDON summary (DBD only) ----
-    lundon_file = os.path.join(script_dir, "viz_lundon_summary.csv")
+    # ---- Merge LUNDON (DBD only) ----
+        if lundon_df is not None:
+            chart_df = chart_df.merge(
+                lundon_df.rename(columns={"DON_OPO": "OPO"}),
+                on="OPO",
+                how="left"
+            )
+        # --- ADD THIS: Ensure no duplicate OPOs before splitting the columns ---
+        chart_df = chart_df.groupby("OPO", as_index=False).agg({
+            "Utilization": "mean",
+            "Mean_LUNDON": "mean"
+        })
 
-    lundon_df = None
-    if os.path.exists(lundon_file):
-        lundon_df = pd.read_csv(lundon_file)
-    # Expect columns: ['DON_OPO', 'Mean_LUNDON']
+    # ---- One Value frame per chart, straight from the two columns ----
+        util_plot_df = chart_df[["OPO", "Utilization"]].rename(columns={"Utilization": "Value"}).dropna()
+        lundon_plot_df = chart_df[["OPO", "Mean_LUNDON"]].rename(columns={"Mean_LUNDON": "Value"}).dropna()
 
-    
+    # --- Compare mode: grouped bars DCD vs DBD ---
+    else:
+        # Calculate utilization as sum(Used) / sum(Total) per OPO and DCD (indexed by both)
+        comp_rates = by_opo_dcd["Used_Donors"] / by_opo_dcd["Total_Donors"]
+
+        # National rows (per DCD status) first, built in one constructor with the OPO rows
+        nat_dcd = [dcd_val for dcd_val in [0, 1] if dcd_val in dcd_rates.index]
+        comp_df = pd.DataFrame(
+            {
+                "DON_OPO": np.concatenate(
+                    [["National"] * len(nat_dcd), comp_rates.index.get_level_values("DON_OPO").to_numpy()]
+                ),
+                "DCD": np.concatenate([nat_dcd, comp_rates.index.get_level_values("DCD").to_numpy()]),
+                "Utilization_Rate": np.concatenate(
+                    [dcd_rates.loc[nat_dcd].to_numpy(), comp_rates.to_numpy()]
+                ),
+            }
+        )
 
-    # Expect columns:
-    # ['Year', 'Month', 'DON_OPO', 'CAS_Period',
-    #  'Total_Donors', 'Used_Donors', 'Utilization_Rate',
-    #  'DCU_Rate', 'DCD']   # DCD: 0 = DBD, 1 = DCD
+        # Filter to selected OPOs + National (one membership pass, no OR of two masks)
+        comp_df = comp_df[comp_df["DON_OPO"].isin(("National",) + opos_for_chart)]
 
-    # ---- OPO locations from map_data (global, loaded at top of app) ----
-    if map_data.empty or not {"OPO_Lat", "OPO_Lon"}.issubset(map_data.columns):
-        st.error("OPO location data not available from map_data.")
-        return
+        # DCD 0/1 are the codes of the donor-type labels, no per-row mapping
+        comp_df["Donor_Type"] = pd.Categorical.from_codes(
+            comp_df["DCD"].to_numpy(dtype="int8"), categories=["DBD", "DCD"]
+        )
 
-    opo_locations = (
-        map_data.groupby("OPO")
-        .agg(
-            OPO_Lat=("OPO_Lat", "first"),
-            OPO_Lon=("OPO_Lon", "first"),
-            Total_Transplants=("Count", "sum")
+        
+        # ---- Add LUNDON as reference (DBD only) ----
+        if lundon_df is not None:
+            lundon_plot = lundon_df.rename(columns={"DON_OPO": "OPO"})
+
+            lundon_plot = (
+                lundon_plot
+                .groupby("OPO", as_index=False)
+                .agg(Value=("Mean_LUNDON", "mean"))
+            )
+
+            # Keep National + selected OPOs
+            if opos_for_chart:
+                lundon_plot = lundon_plot[lundon_plot["OPO"].isin(("National",) + opos_for_chart)]
+
+        util_plot_df = comp_df
+        lundon_plot_df = lundon_plot
+
+
+    # ---- LEFT: Utilization ----
+    if donor_type_filter == "Compare DCD vs DBD":
+        fig_util = px.bar(
+            util_plot_df,
+            x="DON_OPO",
+            y="Utilization_Rate",
+            color="Donor_Type",
+            barmode="group",
+            title="Utilization Rate (DCD vs DBD)",
         )
-        .reset_index()
-        .rename(columns={"OPO": "DON_OPO"})
-    )
+    else:
+      
+        rest = [opo for opo in util_plot_df["OPO"].unique() if opo != "National"]
+        #
 
-    # Merge basic utilization info (overall) to drive map coloring/size
+        opo_order = ['National'] + rest
 
-    overall_util = (
-        util_df.groupby("DON_OPO")
-        .agg(
-            Overall_Utilization=("Utilization_Rate", "mean"),
-            Overall_DCU=("DCU_Rate", "mean"),
-            Overall_Donors=("Total_Donors", "sum")
+        util_plot_df["OPO"] = pd.Categorical(util_plot_df["OPO"], categories=opo_order, ordered=True)
+        fig_util = px.bar(
+            util_plot_df,
+            x="OPO",
+            y="Value",
+            title="Utilization Rate",
+            text_auto=False,
+            category_orders={"OPO": opo_order},
         )
-        .reset_index()
+    fig_util.update_traces(text=None, texttemplate="%{y:.1%}", textposition="outside", cliponaxis=False)
+
+
+    fig_util.update_yaxes(tickformat=".0%", rangemode="tozero")
+
+    # ---- RIGHT: LUNDON ----
+    fig_lundon = px.bar(
+        lundon_plot_df,
+        x="OPO",
+        y="Value",
+        title="Mean LUNDON Score (DBD only)",
+    )
+
+    # Labels are formatted by plotly.js from y, so the spec carries no per-bar strings
+    fig_lundon.update_traces(
+        marker_color="#2ca02c",
+        texttemplate="%{y:.1f}",
+        textposition="outside"
     )
 
+    fig_lundon.update_yaxes(rangemode="tozero")
 
-    opo_map_df = opo_locations.merge(
-        overall_util, on="DON_OPO", how="left"
+    fig_lundon.add_annotation(
+        text="LUNDON calculated from DBD donors only",
+        xref="paper",
+        yref="paper",
+        x=0,
+        y=1.08,
+        showarrow=False,
+        font=dict(size=11, color="gray"),
     )
 
-    # ---- Session state for selected OPOs ----
-    if "selected_opos_util" not in st.session_state:
-        st.session_state.selected_opos_util = []
+    return fig_util, fig_lundon
 
+
+# Nested fragment: changing the CAS / donor-type / reference filters reruns
+# only the metrics and charts below the selection map
+@st.fragment
+def run_utilization_charts(selected_opos):
     # ------------------------------------------------------------------
-    # 1) Controls row (filters & options)
+    # 2) Controls row (filters & options)
     # ------------------------------------------------------------------
     col_f1, col_f2, col_f3 = st.columns([1.4, 1.4, 1.2])
 
@@ -516,162 +983,30 @@ def run_utilization_tab():
 
     st.markdown("---")
 
-    # ------------------------------------------------------------------
-    # 2) Plotly OPO selection map (independent of Survival tab)
-    # ------------------------------------------------------------------
-    st.subheader("Select OPOs on the Map")
-
-    # color by overall utilization (fallback to donors if missing)
-    color_column = "Overall_Utilization"
-    if opo_map_df[color_column].isna().all():
-        color_column = "Overall_Donors"
-
-    # mark selected vs unselected
-    opo_map_df["Selected"] = opo_map_df["DON_OPO"].isin(
-        st.session_state.selected_opos_util
-    )
-    opo_map_df["Status"] = opo_map_df["Selected"].apply(
-        lambda x: "Selected" if x else "Click to select"
-    )
-    fig_map = go.Figure()
-    fig_map.add_trace(
-        go.Scattergeo(
-            lon=opo_map_df["OPO_Lon"],
-            lat=opo_map_df["OPO_Lat"],
-            text=opo_map_df["DON_OPO"],
-            customdata=opo_map_df[["DON_OPO", "Overall_DCU", "Overall_Donors", "Status"]].values,
-            hovertemplate=(
-                "<b>%{customdata[0]}</b><br>"
-                "DCU rate: %{customdata[1]:.1%}<br>"
-                "Total donors: %{customdata[2]}<br>"
-                "%{customdata[3]}<extra></extra>"
-            ),
-            mode="markers",
-            marker=dict(
-            size=(
-                opo_map_df["Overall_Donors"]
-                / max(opo_map_df["Overall_Donors"].max(), 1)
-                * 30 + 8
-            ),
-            color=opo_map_df["Overall_DCU"],
-            colorscale=[
-                [0.0, "#2166ac"],
-                [0.5, "#9970ab"],
-                [1.0, "#b2182b"],
-            ],
-            cmin=0,
-            cmax=1,
-
-            # 🔥 VISUAL FEEDBACK
-            line=dict(
-                width=opo_map_df["Selected"].map(lambda x: 3 if x else 1),
-                color=opo_map_df["Selected"].map(lambda x: "yellow" if x else "white"),
-            ),
-            opacity=opo_map_df["Selected"].map(lambda x: 1.0 if x else 0.6),
-
-            colorbar=dict(title="DCU-era donor"),
-            ),
-        )
-    )
-
-
-    fig_map.update_geos(
-        scope="usa",
-        showland=True,
-        landcolor="lightgray",
-        showlakes=True,
-        lakecolor="white",
-        showcoastlines=True,
-        coastlinecolor="white",
-    )
-
-    fig_map.update_layout(
-        height=420,
-        margin=dict(l=0, r=0, t=0, b=0),
-        geo=dict(bgcolor="rgba(0,0,0,0)"),
-        dragmode=False,
-        title=None,
-    )
-
-    config = {"scrollZoom": False, "displayModeBar": False}
-    event = st.plotly_chart(
-        fig_map,
-        use_container_width=True,
-        on_select="rerun",
-        key="utilization_plotly_map",
-        config=config,
-    )
-
-    # Handle click events (same logic pattern as Survival tab)
-    if event and "selection" in event and "points" in event["selection"]:
-        points = event["selection"]["points"]
-        if points:
-            idx = points[0].get("point_index", None)
-            if idx is not None and 0 <= idx < len(opo_map_df):
-                clicked_opo = opo_map_df.iloc[idx]["DON_OPO"]
-                # toggle
-                if clicked_opo in st.session_state.selected_opos_util:
-                    st.session_state.selected_opos_util.remove(clicked_opo)
-                else:
-                    st.session_state.selected_opos_util.append(clicked_opo)
-                st.rerun()
-
-    # Selected OPOs summary + clear button
-    col_sel1, col_sel2 = st.columns([3, 1])
-    with col_sel1:
-        if st.session_state.selected_opos_util:
-            st.write(
-                "**Selected OPOs:** "
-                + ", ".join(sorted(st.session_state.selected_opos_util))
-            )
-        else:
-            st.write("**Selected OPOs:** None (click OPOs on the map to select)")
-
-    with col_sel2:
-        if st.button("Clear Selection", key="clear_opo_selection_util"):
-            st.session_state.selected_opos_util = []
-            st.rerun()
-
-    selected_opos = st.session_state.selected_opos_util
-
-    st.markdown("---")
-
     # ------------------------------------------------------------------
     # 3) Apply CAS & donor-type filters to utilization data
     # ------------------------------------------------------------------
-    df = util_df.copy()
-
-    # CAS filter
-    if cas_filter != "All":
-        df = df[df["CAS_Period"] == cas_filter]
-
-    # "Compare" handled separately later
+    # Donor sums for the CAS filter, looked up from the precomputed totals
+    # ("Compare" handled separately later)
+    by_opo, _ = util_totals()[cas_filter]
 
     # ------------------------------------------------------------------
     # 4) Compute national metrics & insight cards
     # ------------------------------------------------------------------
-    # For national utilization, use the currently filtered df
-    if len(df) == 0:
+    if by_opo.empty:
         st.warning("No donor records for the chosen filters.")
         return
 
-    # National Utilization = Total Used / Total Donors (not mean of rates)
-    national_util = df["Used_Donors"].sum() / df["Total_Donors"].sum() if df["Total_Donors"].sum() > 0 else 0
-    
-    # DCD/DBD national utilization
-    dcd_df = df[df["DCD"] == 1]
-    dbd_df = df[df["DCD"] == 0]
-    national_dcd_util = dcd_df["Used_Donors"].sum() / dcd_df["Total_Donors"].sum() \
-        if len(dcd_df) > 0 and dcd_df["Total_Donors"].sum() > 0 else None
-    national_dbd_util = dbd_df["Used_Donors"].sum() / dbd_df["Total_Donors"].sum() \
-        if len(dbd_df) > 0 and dbd_df["Total_Donors"].sum() > 0 else None
+    national_util, dcd_rates = national_rates()[cas_filter]
+    national_dcd_util = dcd_rates.get(1)
+    national_dbd_util = dcd_rates.get(0)
 
     if selected_opos:
-        selected_df = df[df["DON_OPO"].isin(selected_opos)]
-        selected_util = selected_df["Used_Donors"].sum() / selected_df["Total_Donors"].sum() \
-            if selected_df["Total_Donors"].sum() > 0 else 0
+        selected_totals = by_opo[by_opo.index.isin(selected_opos)]
+        selected_util = selected_totals["Used_Donors"].sum() / selected_totals["Total_Donors"].sum() \
+            if selected_totals["Total_Donors"].sum() > 0 else 0
         delta_util = selected_util - national_util
-        selected_donors = int(selected_df["Total_Donors"].sum())
+        selected_donors = int(selected_totals["Total_Donors"].sum())
     else:
         selected_util = None
         delta_util = None
@@ -709,151 +1044,57 @@ def run_utilization_tab():
     else:
         opos_for_chart = []  # just national baseline
 
-    # --- Simple mode: All / DBD / DCD ---
-    if donor_type_filter != "Compare DCD vs DBD":
-        # Calculate utilization as sum(Used) / sum(Total) per OPO
-        opo_util_df = df[df["DON_OPO"].isin(opos_for_chart)].groupby("DON_OPO").agg(
-            Used=("Used_Donors", "sum"),
-            Total=("Total_Donors", "sum")
-        ).reset_index()
-
-        opo_util_df["Utilization"] = opo_util_df["Used"] / opo_util_df["Total"]
-        opo_util_df = opo_util_df.rename(columns={"DON_OPO": "OPO"})
-
-    # ---- Base chart dataframe (Utilization) ----
-        chart_df = pd.concat(
-            [
-                pd.DataFrame(
-                    {"OPO": ["National"], "Utilization": [national_util]}
-                ),
-                opo_util_df[["OPO", "Utilization"]],
-            ],
-            ignore_index=True,
-        )   
-
-    # ---- Merge LUNDON (DBD only) ----
-        if lundon_df is not None:
-            chart_df = chart_df.merge(
-                lundon_df.rename(columns={"DON_OPO": "OPO"}),
-                on="OPO",
-                how="left"
-            )
-        # --- ADD THIS: Ensure no duplicate OPOs before melting ---
-        chart_df = chart_df.groupby("OPO", as_index=False).agg({
-            "Utilization": "mean",
-            "Mean_LUNDON": "mean"
-        })
-
-    # ---- Reshape for grouped bars (Utilization vs LUNDON) ----
-        plot_df = chart_df.melt(
-            id_vars="OPO",
-            value_vars=["Utilization", "Mean_LUNDON"],
-            var_name="Metric",
-            value_name="Value"
-        ).dropna()
-
-        util_df = plot_df[plot_df["Metric"] == "Utilization"]
-        lundon_df_plot = plot_df[plot_df["Metric"] == "Mean_LUNDON"]
-
-        lundon_df_plot = (
-            lundon_df_plot
-            .groupby("OPO", as_index=False)
-            .agg(Value=("Value", "mean"))
-        )
-
-
-
-    
-        util_plot_df = util_df
-        lundon_plot_df = lundon_df_plot
-
-
-    
-
-    # --- Compare mode: grouped bars DCD vs DBD ---
-    else:
-        # Calculate utilization as sum(Used) / sum(Total) per OPO and DCD
-        comp_df = df.groupby(["DON_OPO", "DCD"]).agg(
-            Used=("Used_Donors", "sum"),
-            Total=("Total_Donors", "sum")
-        ).reset_index()
-        comp_df["Utilization_Rate"] = comp_df["Used"] / comp_df["Total"]
-
-        # National rows (per DCD status)
-        nat_rows = []
-        for dcd_val in [0, 1]:
-            sub = df[df["DCD"] == dcd_val]
-            if len(sub) > 0 and sub["Total_Donors"].sum() > 0:
-                nat_rows.append(
-                    {
-                        "DON_OPO": "National",
-                        "DCD": dcd_val,
-                        "Utilization_Rate": sub["Used_Donors"].sum() / sub["Total_Donors"].sum(),
-                    }
-                )
-        if nat_rows:
-            comp_df = pd.concat(
-                [pd.DataFrame(nat_rows), comp_df], ignore_index=True
-            )
-
-        # Filter to selected OPOs + National
-        if opos_for_chart:
-            comp_df = comp_df[
-                (comp_df["DON_OPO"] == "National")
-                | (comp_df["DON_OPO"].isin(opos_for_chart))
-            ]
-        else:
-            comp_df = comp_df[comp_df["DON_OPO"] == "National"]
-
-        comp_df["Donor_Type"] = comp_df["DCD"].map(
-            {0: "DBD", 1: "DCD"}
-        )
-
-        
-        # ---- Add LUNDON as reference (DBD only) ----
-        if lundon_df is not None:
-            lundon_plot = lundon_df.rename(columns={"DON_OPO": "OPO"})
-
-            lundon_plot = (
-                lundon_plot
-                .groupby("OPO", as_index=False)
-                .agg(Value=("Mean_LUNDON", "mean"))
-            )
-
-            # Keep National + selected OPOs
-            if opos_for_chart:
-                lundon_plot = lundon_plot[
-                    (lundon_plot["OPO"] == "National")
-                    | (lundon_plot["OPO"].isin(opos_for_chart))
-                ]
-
-        util_plot_df = comp_df.copy()
-        lundon_plot_df = lundon_plot.copy()
-
+    fig_util, fig_lundon = util_bar_figs(tuple(sorted(opos_for_chart)), cas_filter, donor_type_filter)
 
     # ------------------------------------------------------------------
     # 6) Optional: data table for export / inspection
     # ------------------------------------------------------------------
-    with st.expander("Show underlying data table (filtered)"):
-        table_df = df.copy()
-        if opos_for_chart:
-            table_df = table_df[table_df["DON_OPO"].isin(opos_for_chart)]
-        st.dataframe(
-            table_df[
-                [
-                    "Year",
-                    "Month",
-                    "DON_OPO",
-                    "CAS_Period",
-                    "DCD",
-                    "Total_Donors",
-                    "Used_Donors",
-                    "Utilization_Rate",
-                    "DCU_Rate",
-                ]
-            ].rename(columns={"DCD": "DCD(1) vs DBD(0)"}),
-            use_container_width=True,
-        )
+    # Tracked expander: the table is only built and sent while it is open
+    table_expander = st.expander(
+        "Show underlying data table (filtered)",
+        key="util_table_expander",
+        on_change="rerun",
+    )
+    with table_expander:
+        if table_expander.open:
+            table = util_table(tuple(sorted(opos_for_chart)), cas_filter)
+            if table.num_rows <= UTIL_TABLE_STATIC_ROWS:
+                # Small result: a plain static table, no virtualized grid or pager
+                st.table(table)
+            else:
+                # Only one page of rows goes to the browser; the full table is a download.
+                # A single page needs no pager.
+                page = 1
+                if table.num_rows > UTIL_TABLE_PAGE_ROWS:
+                    n_pages = -(-table.num_rows // UTIL_TABLE_PAGE_ROWS)
+                    if st.session_state.get("util_table_page", 1) > n_pages:
+                        # Selection shrank the table below the current page. No value= on
+                        # the widget below: min_value already defaults it to 1, and a
+                        # default plus a Session State write makes Streamlit warn
+                        st.session_state.util_table_page = 1
+                    page = st.number_input(
+                        f"Page (of {n_pages}, {UTIL_TABLE_PAGE_ROWS} rows each)",
+                        min_value=1,
+                        max_value=n_pages,
+                        step=1,
+                        key="util_table_page",
+                    )
+                st.dataframe(
+                    # Zero-copy slice of the cached Arrow table
+                    table.slice((page - 1) * UTIL_TABLE_PAGE_ROWS, UTIL_TABLE_PAGE_ROWS),
+                    width="stretch",
+                    # Stable identity across reruns: the frontend keeps the grid mounted
+                    # (scroll, sort, column widths) instead of recreating it
+                    key="util_table",
+                )
+            st.download_button(
+                "Download full table (CSV)",
+                # Built only when clicked
+                data=lambda: table.to_pandas().to_csv(index=False),
+                file_name="donor_utilization_filtered.csv",
+                mime="text/csv",
+                key="util_table_download",
+            )
     # ==========================
     # Draw utilization + LUNDON
     # ==========================
@@ -861,70 +1102,146 @@ def run_utilization_tab():
 
     # ---- LEFT: Utilization ----
     with col1:
-        if donor_type_filter == "Compare DCD vs DBD":
-            fig_util = px.bar(
-                util_plot_df,
-                x="DON_OPO",
-                y="Utilization_Rate",
-                color="Donor_Type",
-                barmode="group",
-                title="Utilization Rate (DCD vs DBD)",
-            )
-        else:
-          
-            rest = [opo for opo in util_plot_df["OPO"].unique() if opo != "National"]
-            #
-
-            opo_order = ['National'] + rest
-
-            util_plot_df["OPO"] = pd.Categorical(util_plot_df["OPO"], categories=opo_order, ordered=True)
-            fig_util = px.bar(
-                util_plot_df,
-                x="OPO",
-                y="Value",
-                title="Utilization Rate",
-                text_auto=False,
-                category_orders={"OPO": opo_order},
-            )
-        fig_util.update_traces(text=None, texttemplate="%{y:.1%}", textposition="outside", cliponaxis=False)
+        st.plotly_chart(fig_util, width="stretch")
 
+    # ---- RIGHT: LUNDON ----
+    with col2:
+        st.plotly_chart(fig_lundon, width="stretch")
 
-        fig_util.update_yaxes(tickformat=".0%", rangemode="tozero")
 
+@st.fragment
+def run_utilization_tab():
+    st.header("Donor Transplant Utilization")
 
+    # Expect columns:
+    # ['Year', 'Month', 'DON_OPO', 'CAS_Period',
+    #  'Total_Donors', 'Used_Donors', 'Utilization_Rate',
+    #  'DCU_Rate', 'DCD']   # DCD: 0 = DBD, 1 = DCD
 
-        st.plotly_chart(fig_util, use_container_width=True)
+    # ---- OPO locations from map_data (global, loaded at top of app) ----
+    if map_data.empty or not {"OPO_Lat", "OPO_Lon"}.issubset(map_data.columns):
+        st.error("OPO location data not available from map_data.")
+        return
 
-    # ---- RIGHT: LUNDON ----
-    with col2:
-        fig_lundon = px.bar(
-            lundon_plot_df,
-            x="OPO",
-            y="Value",
-            title="Mean LUNDON Score (DBD only)",
-            text=lundon_plot_df["Value"].map(lambda x: f"{x:.1f}"),
-        )
+    # ---- Load donor utilization dataset ----
+    # Cached base frame, read only: the selection styling is built as separate arrays
+    try:
+        opo_map_df = util_opo_map_base()
+    except FileNotFoundError:
+        st.error("Utilization data not found. Run precompute.py first.")
+        return
 
-        fig_lundon.update_traces(
-            marker_color="#2ca02c",
-            textposition="outside"
-        )
+    # ---- Session state for selected OPOs ----
+    if "selected_opos_util" not in st.session_state:
+        st.session_state.selected_opos_util = []
 
-        fig_lundon.update_yaxes(rangemode="tozero")
+    # ------------------------------------------------------------------
+    # 1) Plotly OPO selection map (independent of Survival tab)
+    # ------------------------------------------------------------------
+    st.subheader("Select OPOs on the Map")
 
-        fig_lundon.add_annotation(
-            text="LUNDON calculated from DBD donors only",
-            xref="paper",
-            yref="paper",
-            x=0,
-            y=1.08,
-            showarrow=False,
-            font=dict(size=11, color="gray"),
-        )
+    # color by overall utilization (fallback to donors if missing)
+    color_column = "Overall_Utilization"
+    if opo_map_df[color_column].isna().all():
+        color_column = "Overall_Donors"
+
+    # mark selected vs unselected
+    selected_mask = opo_map_df["DON_OPO"].isin(
+        st.session_state.selected_opos_util
+    ).to_numpy()
+    status = np.where(selected_mask, "Selected", "Click to select")
+
+    # Plain numpy arrays for the trace: Plotly would convert Series anyway
+    opo_names = opo_map_df["DON_OPO"].to_numpy(dtype=object)
+    overall_dcu = opo_map_df["Overall_DCU"].to_numpy(dtype=float, na_value=np.nan)
+    overall_donors = opo_map_df["Overall_Donors"].to_numpy(dtype=float, na_value=np.nan)
+    fig_map = base_geo_fig(
+        lons=opo_map_df["OPO_Lon"].to_numpy(),
+        lats=opo_map_df["OPO_Lat"].to_numpy(),
+        texts=opo_names,
+        hovertemplate=(
+            "<b>%{customdata[0]}</b><br>"
+            "DCU rate: %{customdata[1]:.1%}<br>"
+            "Total donors: %{customdata[2]}<br>"
+            "%{customdata[3]}<extra></extra>"
+        ),
+        marker=dict(
+            size=(
+                overall_donors
+                / max(opo_map_df["Overall_Donors"].max(), 1)
+                * 30 + 8
+            ),
+            color=overall_dcu,
+            colorscale=[
+                [0.0, "#2166ac"],
+                [0.5, "#9970ab"],
+                [1.0, "#b2182b"],
+            ],
+            cmin=0,
+            cmax=1,
+            colorbar=dict(title="DCU-era donor"),
+        ),
+        height=420,
+    )
+    fig_map.update_traces(
+        customdata=np.column_stack([
+            opo_names,
+            overall_dcu.astype(object),
+            opo_map_df["Overall_Donors"].to_numpy(dtype=object),
+            status.astype(object),
+        ]),
+        # 🔥 VISUAL FEEDBACK
+        marker_line=dict(
+            width=np.where(selected_mask, 3, 1),
+            color=np.where(selected_mask, "yellow", "white"),
+        ),
+        marker_opacity=np.where(selected_mask, 1.0, 0.6),
+    )
+
+    config = {"scrollZoom": False, "displayModeBar": False}
+    event = st.plotly_chart(
+        fig_map,
+        width="stretch",
+        on_select="rerun",
+        key="utilization_plotly_map",
+        config=config,
+    )
+
+    # Handle click events (same logic pattern as Survival tab)
+    if event and "selection" in event and "points" in event["selection"]:
+        points = event["selection"]["points"]
+        if points:
+            idx = points[0].get("point_index", None)
+            if idx is not None and 0 <= idx < len(opo_map_df):
+                clicked_opo = opo_names[idx]
+                # toggle
+                if clicked_opo in st.session_state.selected_opos_util:
+                    st.session_state.selected_opos_util.remove(clicked_opo)
+                else:
+                    st.session_state.selected_opos_util.append(clicked_opo)
+                st.rerun()
 
-        st.plotly_chart(fig_lundon, use_container_width=True)
+    # Selected OPOs summary + clear button
+    col_sel1, col_sel2 = st.columns([3, 1])
+    with col_sel1:
+        if st.session_state.selected_opos_util:
+            st.write(
+                "**Selected OPOs:** "
+                + ", ".join(sorted(st.session_state.selected_opos_util))
+            )
+        else:
+            st.write("**Selected OPOs:** None (click OPOs on the map to select)")
+
+    with col_sel2:
+        if st.button("Clear Selection", key="clear_opo_selection_util"):
+            st.session_state.selected_opos_util = []
+            st.rerun()
+
+    selected_opos = st.session_state.selected_opos_util
+
+    st.markdown("---")
 
-       
+    run_utilization_charts(selected_opos)
 
 
 # --- MAIN APP LAYOUT ---
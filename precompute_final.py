@@ -1,11 +1,12 @@
 # precompute.py
+import json
 import pandas as pd
 import pyreadstat
 import numpy as np
 import pgeocode
-from lifelines import KaplanMeierFitter
-from lifelines.statistics import logrank_test
+import math
 import os
+from statistics import NormalDist
 
 # --- PATH CONFIGURATION ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -16,20 +17,118 @@ SOURCE_FILE = os.path.join(
 )
 
 
+# Columns read from each source file: only what the steps below use. Year/Month,
+# REC_TX_DT and any_DCU are optional and skipped when a file doesn't have them.
+REC_COLUMNS = [
+    'REC_TX_DT', 'Year', 'Month', 'DCD', 'DON_OPO', 'REC_CTR_CD', 'OPO_ZIP', 'TXP_CTR_ZIP',
+    'any_DCU', 'GraftTime', 'GraftDeath'
+]
+DON_COLUMNS = ['DON_RECOV_DT', 'DON_OPO', 'DCD', 'Transplanted', 'DCU_any', 'LUNDON']
+
+
+def read_sav_columns(path, columns):
+    # Header first (cheap) to find which of the wanted columns exist, then parse
+    # just those, split across one process per core
+    _, meta = pyreadstat.read_sav(path, metadataonly=True)
+    usecols = [c for c in columns if c in meta.column_names]
+    return pyreadstat.read_file_multiprocessing(
+        pyreadstat.read_sav, path, num_processes=os.cpu_count(), usecols=usecols
+    )
+
+def save_table(df, name):
+    # CSV for inspection, Parquet (typed, columnar) for fast loading in the app
+    df.to_csv(os.path.join(SCRIPT_DIR, f"{name}.csv"), index=False)
+    df.to_parquet(os.path.join(SCRIPT_DIR, f"{name}.parquet"), index=False, compression="zstd")
+
+def map_arc_refs(arcs, fn):
+    # Apply fn to every arc index in a geometry's (nested) arcs list
+    return [map_arc_refs(a, fn) if isinstance(a, list) else fn(a) for a in arcs]
+
+def iter_geometries(obj):
+    # Leaf geometries of a TopoJSON object, descending into GeometryCollections
+    if obj.get('type') == 'GeometryCollection':
+        for geom in obj.get('geometries', []):
+            yield from iter_geometries(geom)
+    else:
+        yield obj
+
+def quantize_topojson(src, dst, quantization=10000, objects=('states',)):
+    # Re-quantize a TopoJSON file onto a coarser integer grid (about 10x the map's
+    # pixel width is plenty) and keep only the objects the app draws, plus the arcs
+    # they reference. Points that collapse onto their predecessor are dropped, so
+    # the arcs get shorter too. Written to dst, so the downloaded src is never
+    # quantized twice by repeated runs.
+    with open(src) as f:
+        topo = json.load(f)
+    if 'transform' not in topo or 'bbox' not in topo:
+        return
+    topo['objects'] = {name: obj for name, obj in topo['objects'].items() if name in objects}
+
+    # Renumber the referenced arcs (~i refers to arc i reversed) and drop the rest
+    used = set()
+    geometries = [g for obj in topo['objects'].values() for g in iter_geometries(obj) if 'arcs' in g]
+    for geom in geometries:
+        map_arc_refs(geom['arcs'], lambda i: used.add(i if i >= 0 else ~i))
+    kept = sorted(used)
+    new_index = {old: new for new, old in enumerate(kept)}
+    for geom in geometries:
+        geom['arcs'] = map_arc_refs(geom['arcs'], lambda i: new_index[i] if i >= 0 else ~new_index[~i])
+
+    (sx, sy), (tx, ty) = topo['transform']['scale'], topo['transform']['translate']
+    x0, y0, x1, y1 = topo['bbox']
+    kx = (x1 - x0) / (quantization - 1) if x1 > x0 else 1
+    ky = (y1 - y0) / (quantization - 1) if y1 > y0 else 1
+
+    arcs = []
+    for arc in (topo['arcs'][i] for i in kept):
+        # Arcs are delta-encoded: cumulative sums give the old grid positions
+        pts = np.cumsum(np.asarray(arc, dtype=np.int64), axis=0)
+        q = np.column_stack([
+            np.round((pts[:, 0] * sx + tx - x0) / kx),
+            np.round((pts[:, 1] * sy + ty - y0) / ky),
+        ]).astype(np.int64)
+        keep = np.ones(len(q), dtype=bool)
+        keep[1:] = (np.diff(q, axis=0) != 0).any(axis=1)
+        keep[-1] = True  # arc endpoints are shared with neighbouring arcs
+        q = q[keep]
+        arcs.append(np.vstack([q[:1], np.diff(q, axis=0)]).tolist())
+
+    topo['transform'] = {'scale': [kx, ky], 'translate': [x0, y0]}
+    topo['arcs'] = arcs
+    with open(dst, 'w') as f:
+        json.dump(topo, f, separators=(',', ':'))
+
 def get_geocoder():
     return pgeocode.Nominatim('us')
 
-def get_coords(zip_code, geocoder):
-    if pd.isna(zip_code) or str(zip_code).strip() == '':
-        return None, None
-    zip_str = str(zip_code).strip()[:5].zfill(5)
-    try:
-        loc = geocoder.query_postal_code(zip_str)
-        if not pd.isna(loc['latitude']):
-            return loc['latitude'], loc['longitude']
-    except:
-        pass
-    return None, None
+# Geocoded ZIPs from earlier runs; the GeoNames postal data doesn't change between runs
+ZIP_CACHE_FILE = os.path.join(SCRIPT_DIR, "zip_coords_cache.parquet")
+
+def geocode_zips(zips):
+    # Lat/Lon for each ZIP key (NaN when not found). ZIPs not in the on-disk cache
+    # go to pgeocode in one batched query rather than one query per ZIP; the
+    # GeoNames table is only loaded when there are such ZIPs.
+    if os.path.exists(ZIP_CACHE_FILE):
+        cache = pd.read_parquet(ZIP_CACHE_FILE)
+    else:
+        cache = pd.DataFrame({'Lat': [], 'Lon': []}, index=pd.Index([], dtype=object))
+    missing = pd.Index(zips).difference(cache.index)
+    if len(missing) > 0:
+        codes = pd.Series(missing, dtype=str).str.strip().str[:5].str.zfill(5)
+        found = get_geocoder().query_postal_code(codes.tolist())
+        new = pd.DataFrame({
+            'Lat': found['latitude'].to_numpy(dtype=float),
+            'Lon': found['longitude'].to_numpy(dtype=float)
+        }, index=missing)
+        cache = pd.concat([cache, new])
+        cache.to_parquet(ZIP_CACHE_FILE)
+    return cache.reindex(zips)
+
+def zip5(col):
+    # First five characters of a categorical ZIP column: sliced once per distinct
+    # ZIP, then expanded back to the rows by category code
+    zips = col.cat.categories.astype(str).str[:5]
+    return pd.Series(zips.take(col.cat.codes), index=col.index)
 
 def main():
     print(f"Running script in: {SCRIPT_DIR}")
@@ -37,19 +136,22 @@ def main():
     # 1. Load Data
     try:
         print("1. Loading raw data...")
-        df, meta = pyreadstat.read_sav(SOURCE_FILE)
+        df, meta = read_sav_columns(SOURCE_FILE, REC_COLUMNS)
 
         # Load donor-level data
         DONOR_FILE = os.path.join(
             "/Users/lanrr/Downloads/706_Data_Visualization/drive-download-20251208T024017Z-1-001",
             "LU_DON_MAP.sav"
         )
-        donor_df, donor_meta = pyreadstat.read_sav(DONOR_FILE)
+        donor_df, donor_meta = read_sav_columns(DONOR_FILE, DON_COLUMNS)
 
         # Clean donor dates
         donor_df["DON_RECOV_DT"] = pd.to_datetime(donor_df["DON_RECOV_DT"], errors="coerce")
         donor_df["Year"] = donor_df["DON_RECOV_DT"].dt.year
         donor_df["Month"] = donor_df["DON_RECOV_DT"].dt.month
+        # Year/Month stay as the date accessor returns them, so the saved tables keep
+        # their original float columns
+        donor_df["DON_OPO"] = donor_df["DON_OPO"].astype("category")
 
     except FileNotFoundError:
         print(f"ERROR: Could not find file at {SOURCE_FILE}")
@@ -65,111 +167,179 @@ def main():
         df['REC_TX_DT'] = pd.to_datetime(df['REC_TX_DT'], errors='coerce')
         df['Year'] = df['REC_TX_DT'].dt.year
         df['Month'] = df['REC_TX_DT'].dt.month
+
+    # Name keys as categoricals and calendar parts as small nullable ints, so the
+    # groupbys below hash integer codes instead of Python strings
+    df = df.astype({c: 'category' for c in ['DON_OPO', 'REC_CTR_CD', 'OPO_ZIP', 'TXP_CTR_ZIP'] if c in df.columns})
+    df = df.astype({c: t for c, t in {'Year': 'Int16', 'Month': 'Int8'}.items() if c in df.columns})
     
-    df_dcd0 = df[df['DCD'] == 0].copy()
+    df_dcd0 = df[df['DCD'] == 0]
 
 
     # 2. Map Data
     print("2. Processing Map Data...")
-    nomi = get_geocoder()
-    map_data = []
-    zip_cache = {}
     
     # Group by Year, Month, OPO, Center, and ZIP codes
-    grouped = df_dcd0.groupby(['Year', 'Month', 'DON_OPO', 'REC_CTR_CD', 'OPO_ZIP', 'TXP_CTR_ZIP']).size().reset_index(name='Count')
+    grouped = df_dcd0.groupby(['Year', 'Month', 'DON_OPO', 'REC_CTR_CD', 'OPO_ZIP', 'TXP_CTR_ZIP'], observed=True).size().reset_index(name='Count')
+    
+    # DCU rate per Year/Month/OPO/Center from one groupby, joined onto the groups
+    # (instead of a boolean filter over df_dcd0 for every group).
+    # Numerator/denominator let the app re-aggregate DCU over any date range
+    dcu_keys = ['Year', 'Month', 'DON_OPO', 'REC_CTR_CD']
+    if 'any_DCU' in df_dcd0.columns:
+        dcu = df_dcd0.groupby(dcu_keys, observed=True)['any_DCU'].agg(DCU_Rate='mean', DCU_num='sum', DCU_den='count')
+    else:
+        dcu = df_dcd0.groupby(dcu_keys, observed=True).size().to_frame('DCU_den').assign(DCU_Rate=0, DCU_num=0)
+    grouped = grouped.merge(dcu.reset_index(), on=dcu_keys, how='left')
+    
+    # Geocode each distinct ZIP once, then look the coordinates up per group
+    opo_zip = zip5(grouped['OPO_ZIP'])
+    ctr_zip = zip5(grouped['TXP_CTR_ZIP'])
+    zip_coords = geocode_zips(pd.unique(pd.concat([opo_zip, ctr_zip])))
+    opo_coords = zip_coords.reindex(opo_zip)
+    ctr_coords = zip_coords.reindex(ctr_zip)
     
-    for i, row in grouped.iterrows():
-        # Quick check for DCU rate
-        subset = df_dcd0[(df_dcd0['Year'] == row['Year']) & 
-                         (df_dcd0['Month'] == row['Month']) &
-                         (df_dcd0['DON_OPO'] == row['DON_OPO']) & 
-                         (df_dcd0['REC_CTR_CD'] == row['REC_CTR_CD'])]
-        dcu_rate = subset['any_DCU'].mean() if 'any_DCU' in subset.columns else 0
-        
-        opo_zip = str(row['OPO_ZIP'])[:5]
-        if opo_zip not in zip_cache: zip_cache[opo_zip] = get_coords(opo_zip, nomi)
-        
-        ctr_zip = str(row['TXP_CTR_ZIP'])[:5]
-        if ctr_zip not in zip_cache: zip_cache[ctr_zip] = get_coords(ctr_zip, nomi)
-        
-        if zip_cache[opo_zip][0] and zip_cache[ctr_zip][0]:
-            map_data.append({
-                'Year': int(row['Year']),
-                'Month': int(row['Month']),
-                'OPO': row['DON_OPO'],
-                'OPO_Zip': opo_zip,
-                'OPO_Lat': zip_cache[opo_zip][0],
-                'OPO_Lon': zip_cache[opo_zip][1],
-                'Center': row['REC_CTR_CD'],
-                'Center_Zip': ctr_zip,
-                'Center_Lat': zip_cache[ctr_zip][0],
-                'Center_Lon': zip_cache[ctr_zip][1],
-                'Count': row['Count'],
-                'DCU_Rate': dcu_rate
-            })
-
-    pd.DataFrame(map_data).to_csv(os.path.join(SCRIPT_DIR, 'viz_map_data.csv'), index=False)
+    year = grouped['Year'].astype(int)
+    month = grouped['Month'].astype(int)
+    map_df = pd.DataFrame({
+        'Year': year,
+        'Month': month,
+        'YearMonthNum': year * 100 + month,
+        'OPO': grouped['DON_OPO'],
+        'OPO_Zip': opo_zip,
+        'OPO_Lat': opo_coords['Lat'].to_numpy(),
+        'OPO_Lon': opo_coords['Lon'].to_numpy(),
+        'Center': grouped['REC_CTR_CD'],
+        'Center_Zip': ctr_zip,
+        'Center_Lat': ctr_coords['Lat'].to_numpy(),
+        'Center_Lon': ctr_coords['Lon'].to_numpy(),
+        'Count': grouped['Count'],
+        'DCU_Rate': grouped['DCU_Rate'],
+        'DCU_num': grouped['DCU_num'],
+        'DCU_den': grouped['DCU_den']
+    })
+    # Keep groups where both ends geocoded
+    map_df = map_df[map_df['OPO_Lat'].notna() & map_df['Center_Lat'].notna()]
+
+    # Sorted by month so the app can slice a date range with searchsorted
+    map_df = map_df.sort_values('YearMonthNum', kind='stable')
+    # Categorical name keys are stored dictionary-encoded in the Parquet file
+    for c in ['OPO', 'Center']:
+        map_df[c] = map_df[c].astype('category').cat.remove_unused_categories()
+    save_table(map_df, 'viz_map_data')
+
+    # Monthly OPO x Center tiles: the app sums these for the selected date range
+    # Coordinates/ZIPs are fixed per OPO/Center pair, so they ride along with
+    # 'first' instead of being hashed as group keys
+    map_tiles = map_df.groupby(['OPO', 'Center', 'YearMonthNum'], sort=False, observed=True).agg(
+        **{c: (c, 'first') for c in ['OPO_Lat', 'OPO_Lon', 'Center_Lat', 'Center_Lon', 'OPO_Zip', 'Center_Zip']},
+        Count=('Count', 'sum'),
+        DCU_num=('DCU_num', 'sum'),
+        DCU_den=('DCU_den', 'sum')
+    ).reset_index()
+    save_table(map_tiles, 'viz_map_tiles')
+
+    # One row per OPO (location, all-time transplants) for the selection maps
+    # Coordinates are fixed per OPO: dedupe them, only the counts need summing
+    opo_coords = map_df.drop_duplicates('OPO').set_index('OPO')[['OPO_Lat', 'OPO_Lon']]
+    opo_totals = map_df.groupby('OPO', observed=True)['Count'].sum().rename('Transplants')
+    opo_locations = opo_coords.join(opo_totals).sort_index().reset_index()
+    save_table(opo_locations, 'viz_opo_locations')
+
+    # Monthly per-OPO rollup for the map's OPO layer. Served from ./static so the
+    # browser loads it once by URL and filters/sums the slider range itself.
+    opo_by_ym = map_tiles.groupby(
+        ['OPO', 'YearMonthNum', 'OPO_Lat', 'OPO_Lon'], sort=False, observed=True
+    )[['Count', 'DCU_num', 'DCU_den']].sum().reset_index()
+    os.makedirs(os.path.join(SCRIPT_DIR, 'static'), exist_ok=True)
+    opo_by_ym.to_json(os.path.join(SCRIPT_DIR, 'static', 'viz_opo_by_ym.json'), orient='records')
+
+    # Map background (downloaded into ./static by the devcontainer): a coarser
+    # grid and only the states object, so the browser parses fewer vertices
+    states_path = os.path.join(SCRIPT_DIR, 'static', 'states-10m.json')
+    if os.path.exists(states_path):
+        quantize_topojson(states_path, os.path.join(SCRIPT_DIR, 'static', 'states-quantized.json'))
 
     # 3. Survival Data (THE FIX IS HERE)
     print("3. Calculating Survival Curves...")
-    s_df = df_dcd0[(df_dcd0['REC_TX_DT'] >= '2018-01-01') & (df_dcd0['REC_TX_DT'] <= '2024-12-31')].copy()
-    s_df['GraftTime'] = pd.to_numeric(s_df['GraftTime'], errors='coerce')
-    s_df['GraftDeath'] = pd.to_numeric(s_df['GraftDeath'], errors='coerce')
+    # Only the three columns this step reads are carried over from df_dcd0
+    in_window = (df_dcd0['REC_TX_DT'] >= '2018-01-01') & (df_dcd0['REC_TX_DT'] <= '2024-12-31')
+    s_df = df_dcd0.loc[in_window, ['DON_OPO', 'GraftTime', 'GraftDeath']].assign(
+        GraftTime=lambda d: pd.to_numeric(d['GraftTime'], errors='coerce'),
+        GraftDeath=lambda d: pd.to_numeric(d['GraftDeath'], errors='coerce'),
+    )
     s_df = s_df.dropna(subset=['GraftTime', 'GraftDeath'])
     s_df = s_df[(s_df['GraftTime'] >= 0)]
 
-    # Convert to boolean: 1 (event/death) → True, 0 (censored/survive) → False
-    # Per lifelines docs: True = event observed, False = censored
-    s_df['EventObserved'] = s_df['GraftDeath'] == 1
-    
-    # Censor patients at 1825 days instead of removing them
-    # If GraftTime > 1825 and they survived, censor them at 1825
-    s_df.loc[(s_df['GraftTime'] > 1825) & (s_df['EventObserved'] == False), 'GraftTime'] = 1825
+    # GraftDeath: 1 = event (death) observed, 0 = censored (survived)
     # If GraftTime > 1825 and they died (after 5 years), exclude them (event outside our window)
-    s_df = s_df[~((s_df['GraftTime'] > 1825) & (s_df['EventObserved'] == True))]
-
-
-    kmf = KaplanMeierFitter()
-    curve_export = []
-    p_values = []
-    
-    # Helper to standardise dataframe columns
-    def process_km(fitter, label_name):
-        d = fitter.survival_function_
-        # RENAME column to standard 'survival_prob'
-        d.columns = ['survival_prob'] 
-        d['ci_lower'] = fitter.confidence_interval_.iloc[:, 0]
-        d['ci_upper'] = fitter.confidence_interval_.iloc[:, 1]
-        d['Group'] = label_name
-        d['GraftTime'] = d.index
-        return d
-
-    # Nationwide
-    kmf.fit(s_df['GraftTime'], s_df['GraftDeath'], label='Nationwide')
-    curve_export.append(process_km(kmf, 'Nationwide'))
-    
-    # OPOs
-    opos = s_df['DON_OPO'].unique()
-    print(f"   - Processing {len(opos)} OPOs...")
-    
-    for opo in opos:
-        subset = s_df[s_df['DON_OPO'] == opo]
-        rest = s_df[s_df['DON_OPO'] != opo]
-        if len(subset) > 10:
-            kmf.fit(subset['GraftTime'], subset['GraftDeath'], label=str(opo))
-            curve_export.append(process_km(kmf, str(opo)))
-            
-            # P-Values
-            try:
-                res = logrank_test(subset['GraftTime'], rest['GraftTime'], 
-                                   event_observed_A=subset['GraftDeath'], 
-                                   event_observed_B=rest['GraftDeath'])
-                p_values.append({'OPO': opo, 'P_Value': res.p_value})
-            except:
-                p_values.append({'OPO': opo, 'P_Value': np.nan})
-
-    pd.concat(curve_export).to_csv(os.path.join(SCRIPT_DIR, 'viz_survival_curves.csv'), index=False)
-    pd.DataFrame(p_values).to_csv(os.path.join(SCRIPT_DIR, 'viz_survival_stats.csv'), index=False)
+    s_df = s_df[~((s_df['GraftTime'] > 1825) & (s_df['GraftDeath'] == 1))]
+    # Censor the remaining patients (survivors) at 1825 days instead of removing them
+    s_df = s_df.assign(GraftTime=s_df['GraftTime'].clip(upper=1825))
+
+
+    # All curves and logrank tests come out of one (group x time) table instead of
+    # a lifelines refit per OPO: deaths/removals per cell, at-risk counts as reverse
+    # cumulative sums, then the product-limit estimate along each row. Same formulas
+    # (exponential Greenwood CI, 95%) as KaplanMeierFitter and logrank_test.
+    graft_time = s_df['GraftTime'].to_numpy(dtype=float)
+    graft_death = s_df['GraftDeath'].to_numpy().astype(int)
+    opo_codes, opo_names = pd.factorize(s_df['DON_OPO'])
+    print(f"   - Processing {len(opo_names)} OPOs...")
+
+    # Every curve starts at t=0; row 0 is Nationwide, row k+1 is opo_names[k]
+    timeline = np.union1d(0.0, graft_time)
+    t_idx = np.searchsorted(timeline, graft_time)
+    has_opo = opo_codes >= 0
+    removed = np.zeros((len(opo_names) + 1, len(timeline)))
+    died = np.zeros_like(removed)
+    removed[0] = np.bincount(t_idx, minlength=len(timeline))
+    died[0] = np.bincount(t_idx, weights=graft_death, minlength=len(timeline))
+    np.add.at(removed, (opo_codes[has_opo] + 1, t_idx[has_opo]), 1)
+    np.add.at(died, (opo_codes[has_opo] + 1, t_idx[has_opo]), graft_death[has_opo])
+    at_risk = removed[:, ::-1].cumsum(axis=1)[:, ::-1]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_surv = np.cumsum(np.where(died > 0, np.log(at_risk - died) - np.log(at_risk), 0.0), axis=1)
+        greenwood = np.cumsum(np.where((died > 0) & (at_risk > died), died / (at_risk * (at_risk - died)), 0.0), axis=1)
+        surv = np.exp(log_surv)
+        z = NormalDist().inv_cdf(0.975)
+        v = np.log(surv)
+        ci_lower = np.exp(-np.exp(np.log(-v) - z * np.sqrt(greenwood) / v))
+        ci_upper = np.exp(-np.exp(np.log(-v) + z * np.sqrt(greenwood) / v))
+    ci_lower[np.isnan(ci_lower)] = 1.0
+    ci_upper[np.isnan(ci_upper)] = 1.0
+
+    # Logrank of each OPO against everyone else: the pooled row is Nationwide
+    n, d = at_risk[0], died[0]
+    expected = (at_risk[1:] * (d / n)).sum(axis=1)
+    factor = np.divide(n - d, n - 1, out=np.ones_like(n), where=n > 1) * d / n ** 2
+    variance = (at_risk[1:] * (n - at_risk[1:]) * factor).sum(axis=1)
+    chi2 = np.divide((died[1:].sum(axis=1) - expected) ** 2, variance,
+                     out=np.zeros_like(variance), where=variance > 0)
+
+    # Keep OPOs with more than 10 recipients; each curve lists only its own times
+    kept = np.flatnonzero(np.bincount(opo_codes[has_opo], minlength=len(opo_names)) > 10)
+    rows = np.concatenate([[0], kept + 1])
+    shown = removed[rows] > 0
+    shown[:, 0] = True
+    r, c = np.nonzero(shown)
+    g = rows[r]
+    labels = np.array(['Nationwide'] + [str(o) for o in opo_names], dtype=object)
+    curves = pd.DataFrame({
+        'survival_prob': surv[g, c],
+        'ci_lower': ci_lower[g, c],
+        'ci_upper': ci_upper[g, c],
+        'Group': labels[g],
+        'GraftTime': timeline[c],
+    })
+    p_values = pd.DataFrame({
+        'OPO': labels[kept + 1],
+        'P_Value': [math.erfc(math.sqrt(x / 2)) for x in chi2[kept]],
+    })
+
+    save_table(curves, 'viz_survival_curves')
+    save_table(p_values, 'viz_survival_stats')
 
 
    
@@ -182,18 +352,28 @@ def main():
     CAS_DATE = pd.to_datetime("2023-03-09")
 
     # Pre/Post CAS classification
-    donor_df["CAS_Period"] = donor_df["DON_RECOV_DT"].apply(
-        lambda d: "Pre-CAS" if d < CAS_DATE else "Post-CAS"
+    # One vectorized comparison; categorical codes 0/1 instead of per-row strings.
+    # Written as "not before" so missing dates land in Post-CAS, as they always have.
+    # Categories in lexical order (Post-CAS = 0), so sorted groupby output keeps the
+    # row order the string labels gave.
+    pre_cas = (donor_df["DON_RECOV_DT"] < CAS_DATE).to_numpy()
+    donor_df["CAS_Period"] = pd.Categorical.from_codes(
+        pre_cas.astype("int8"), categories=["Post-CAS", "Pre-CAS"]
     )
     
+    # DBD donors with a LUNDON score: only needed for the per-OPO median below
     lundon_df = donor_df[
         (donor_df["DCD"] == 0) &
         (~donor_df["LUNDON"].isna())
-    ].copy()
+    ]
     
-        # Monthly OPO-level donor utilization summary, including LUNDON (DBD will have non-missing)
-    donor_util = (
-        donor_df.groupby(["Year", "Month", "DON_OPO", "CAS_Period", "DCD"])
+    # Monthly OPO-level donor utilization summary, including LUNDON (DBD will have non-missing).
+    # This is the one pass over all donors; the coarser tables are re-aggregated from it.
+    # NaN keys are kept here (dropna=False) so the OPO-level LUNDON summary still counts
+    # donors without a recovery date, and dropped again for the monthly table.
+    donor_keys = ["Year", "Month", "DON_OPO", "CAS_Period", "DCD"]
+    donor_groups = (
+        donor_df.groupby(donor_keys, observed=True, dropna=False)
         .agg(
             Total_Donors=("Transplanted", "count"),
             Used_Donors=("Transplanted", "sum"),
@@ -202,44 +382,45 @@ def main():
             Mean_LUNDON=("LUNDON", "mean"),
             Median_LUNDON=("LUNDON", "median"),
             N_LUNDON=("LUNDON", "count"),
+            Sum_LUNDON=("LUNDON", "sum"),
         )
         .reset_index()
     )
+    donor_util = donor_groups.dropna(subset=donor_keys).drop(columns="Sum_LUNDON")
 
-    donor_util.to_csv(os.path.join(SCRIPT_DIR, "viz_donor_utilization.csv"), index=False)
+    donor_util["DON_OPO"] = donor_util["DON_OPO"].cat.remove_unused_categories()
+    save_table(donor_util, "viz_donor_utilization")
 
-    # CAS summary (OPO-level, not monthly)
-    donor_cas_summary = (
-        donor_df.groupby(["DON_OPO", "CAS_Period"])
-        .agg(
-            Total=("Transplanted", "count"),
-            Used=("Transplanted", "sum"),
-            Utilization=("Transplanted", "mean")
-        )
+    # Donor sums per OPO x CAS period x donor type: the app slices this cube for
+    # every utilization number instead of regrouping the monthly rows
+    util_cube = (
+        donor_util.groupby(["DON_OPO", "CAS_Period", "DCD"], observed=True)[["Used_Donors", "Total_Donors"]]
+        .sum()
         .reset_index()
     )
-
-    donor_lundon_summary = (
-        lundon_df
-        .groupby(["DON_OPO", "CAS_Period"])
-        .agg(
-            Mean_LUNDON=("LUNDON", "mean"),
-            Median_LUNDON=("LUNDON", "median"),
-            N=("LUNDON", "count")
-        )
-        .reset_index()
+    save_table(util_cube, "viz_util_cube")
+
+    # LUNDON per OPO x CAS period (DBD only): mean and count from the monthly sums,
+    # only the median needs the donor rows
+    lundon_totals = (
+        donor_groups[donor_groups["DCD"] == 0]
+        .groupby(["DON_OPO", "CAS_Period"], observed=True)[["Sum_LUNDON", "N_LUNDON"]]
+        .sum()
     )
+    lundon_totals = lundon_totals[lundon_totals["N_LUNDON"] > 0]
+    donor_lundon_summary = pd.DataFrame({
+        "Mean_LUNDON": lundon_totals["Sum_LUNDON"] / lundon_totals["N_LUNDON"],
+        "Median_LUNDON": lundon_df.groupby(["DON_OPO", "CAS_Period"], observed=True)["LUNDON"].median(),
+        "N": lundon_totals["N_LUNDON"],
+    }).reset_index()
 
-    donor_lundon_summary.to_csv(
-        os.path.join(SCRIPT_DIR, "viz_lundon_summary.csv"),
-        index=False
-    )
+    save_table(donor_lundon_summary, "viz_lundon_summary")
 
 
 
 
 
-    print("DONE! CSVs regenerated with correct column names.")
+    print("DONE! CSV and Parquet outputs regenerated with correct column names.")
 
 if __name__ == "__main__":
     main()
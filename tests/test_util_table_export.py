@@ -0,0 +1,35 @@
+import os
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app_final.py")
+
+
+def test_util_table_csv_export_keeps_exact_rates(monkeypatch):
+    # Capture the deferred CSV builder handed to the download button
+    downloads = {}
+    download_button = st.download_button
+
+    def capture(label, data, **kwargs):
+        downloads[kwargs.get("key")] = data
+        return download_button(label, data, **kwargs)
+
+    monkeypatch.setattr(st, "download_button", capture)
+
+    at = AppTest.from_file(APP_FILE, default_timeout=120)
+    at.run()
+    at.session_state["util_table_expander"] = True
+    at.session_state["selected_opos_util"] = ["ALOB"]
+    at.radio(key="active_tab").set_value("Utilization").run()
+    assert not at.exception
+
+    csv_text = downloads["util_table_download"]()
+    lines = csv_text.splitlines()
+    assert lines[0] == (
+        "Year,Month,DON_OPO,CAS_Period,DCD(1) vs DBD(0),"
+        "Total_Donors,Used_Donors,Utilization_Rate,DCU_Rate"
+    )
+    # ALOB, January 2018, DBD: 2 of 10 donors used
+    assert "2018,1,ALOB,Pre-CAS,0.0,10,2,0.2,1.0" in lines
+    assert "0.20000000298023224" not in csv_text